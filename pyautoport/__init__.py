@@ -29,10 +29,71 @@
 
 # __init__.py
 """
-Load all functions by default
+Public names of all modules, as their star-imports exported, imported on first use
+
+Only the module of a function is imported when it is first accessed, so that
+importing pyautoport, or running one of its commands, stays fast.
 """
 
-from .adb import *
-from .uart import *
-from .teraterm import *
-from .session import *
+import importlib
+
+_MODULE_ATTRIBUTES = {
+    'adb': (
+        'adb_open', 'adb_reopen', 'adb_close', 'adb_send', 'adb_send_async', 'adb_tail',
+        'adb_send_via_bash', 'adb_tail_via_bash', 'adb_close_via_bash', 'open_adb_daemon_on_demand',
+        'start_adb_daemon', 'force_kill_adb_shell', 'send_request', 'tail_request', 'AdbResponse',
+        'PORT_ABD_WRITE', 'PORT_ADB_SET_TIMEOUT', 'get_default_adb_buffer_size', 'OutputRing',
+        'AdbShell', 'CommandEnd', 'Responder', 'get_default_adb_idle_timeout', 'AdbDaemon',
+        'serve_adb_daemon', 'close_adb_shell', 'REQUEST_IDS', 'EXIT_STATUS_TIMEOUT',
+    ),
+    'uart': (
+        'uart_send', 'write_and_read_uart', 'iter_uart', 'write_uart', 'parse_uart_batch',
+        'run_uart_batch', 'close_uart_ports', 'UART_POOL', 'get_default_port',
+        'get_default_baudrate', 'PACING_MODES', 'FLOW_CONTROLS', 'DEFAULT_CHUNK_SIZE',
+        'DEFAULT_PACING_DELAY', 'DEFAULT_PROMPT', 'DRAIN_INTERVAL', 'DRAIN_BUFFER_SIZE',
+        'EXIT_CLOSE_TIMEOUT', 'get_default_idle_timeout', 'get_flow_control_settings', 'PooledPort',
+        'UartPortPool',
+    ),
+    'teraterm': (
+        'session_start', 'open_session_start', 'session_stop', 'SessionClient', 'SessionError',
+        'client_socket_send', 'get_env_via_bash', 'set_env_via_bash', 'connect_via_bash',
+        'disconnect_via_bash', 'send_via_bash', 'start_log_via_bash', 'stop_log_via_bash',
+        'set_timestamp_via_bash', 'set_timeout_via_bash', 'set_pause_via_bash', 'send_log_via_bash',
+        'wait_log_via_bash', 'PORT_WRITE', 'PID_FILE', 'event_stop_session',
+        'event_session_listening', 'client_handle', 'recv_handle', 'worker_handle',
+        'run_command', 'check_connection', 'get_env', 'set_env', 'open_conn', 'close_conn', 'send',
+        'set_log', 'start_log', 'stop_log', 'set_timestamp', 'pause', 'set_timeout', 'send_log',
+        'wait_log', 'HANDLE_ACTIONS', 'bash_socket_send', 'add_to_argument', 'get_connection_type',
+    ),
+    'session': (
+        'ConnectSession', 'ADBStrategy', 'TTYStrategy',
+    ),
+    'ttl': (
+        'run_ttl', 'run_ttl_via_bash', 'parse_ttl', 'TtlRunner', 'TtlError', 'Command', 'Assign',
+        'Keyword', 'For', 'While', 'If', 'KEYWORDS', 'BINARY_OPERATORS', 'COMPARE_OPERATORS',
+        'connection_arg', 'split_connection', 'wait_patterns', 'COMMANDS', 'UnsupportedExpression',
+        'Break', 'Continue', 'Exit', 'strip_comment', 'parse_block', 'parse_if', 'parse_simple',
+        'to_python', 'evaluate', 'evaluate_node', 'evaluate_compare', 'run_block', 'ASSIGNMENT',
+        'VARIABLE', 'STRING',
+    ),
+}
+_ATTRIBUTE_MODULES = {
+    name: module for module, names in _MODULE_ATTRIBUTES.items() for name in names
+}
+
+__all__ = sorted(_ATTRIBUTE_MODULES)
+
+
+def __getattr__(name):
+    if name in _ATTRIBUTE_MODULES:
+        value = getattr(importlib.import_module(f'.{_ATTRIBUTE_MODULES[name]}', __name__), name)
+        # Later accesses do not go through __getattr__
+        globals()[name] = value
+        return value
+    if name in _MODULE_ATTRIBUTES:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_ATTRIBUTE_MODULES) | set(_MODULE_ATTRIBUTES))
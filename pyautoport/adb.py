@@ -26,38 +26,39 @@
 # CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
-
 """
 ADB Basic Mode
 """
 
 import argparse
+import asyncio
+import codecs
+import itertools
+import re
 import subprocess
 import threading
 import socket
+import sys
 import time
 import os
-import select
-from queue import Queue
+import uuid
+from pyautoport import protocol, transport
 
 PORT_ABD_WRITE = 18888
 PORT_ADB_SET_TIMEOUT = 18889
+# Exit status of adb_send when the command did not end before the timeout, as timeout(1)
+EXIT_STATUS_TIMEOUT = 124
 # Set the PID_FILE path based on the operating system
 if os.name == 'nt':  # Windows
     PID_FILE = os.path.join(os.getenv('TEMP', 'C:\\Temp'), 'tester-adb-daemon.pid')
-else:  # Unix/Linux
-    PID_FILE = '/tmp/tester-adb-daemon.pid'
-
-EVENT_STOP_ADB_SESSION = threading.Event()
-EVENT_STOP_ADB_SESSION.clear()
-QUEUE_ADB_OUTPUT = Queue()
+else:  # Unix/Linux, one per user
+    PID_FILE = os.path.join(transport.runtime_dir(), 'tester-adb-daemon.pid')
 
 
 # Daemon
 def open_adb_daemon_on_demand():
     """Open thread when no thread is running"""
     if not os.path.exists(PID_FILE):
-        EVENT_STOP_ADB_SESSION.clear()
         adb_daemon_thread = threading.Thread(target=start_adb_daemon)
         adb_daemon_thread.start()
     else:
@@ -68,102 +69,435 @@ Run adb_reopen& instead to kill all other adb_open sessions
         ''')
 
 
-def read_and_respond_until_timeout(client_socket, adb_timeout=1):
-    """Send received text to client"""
-    last_update = time.time()
+def get_default_adb_buffer_size():
+    """Returns the number of output bytes kept per adb shell.
+    Read from the TESTER_ADB_BUFFER_SIZE environment variable or defaulting to 1 MiB."""
+    return int(os.environ.get("TESTER_ADB_BUFFER_SIZE", str(1024 * 1024)))
+
+
+class OutputRing:
+    """Bounded buffer of adb shell output.
+
+    Output is addressed by sequence numbers counting bytes since the shell
+    started, and every reader keeps its own cursor. When the buffer is full the
+    oldest output is dropped: readers whose cursor is behind skip to the oldest
+    output left, and each such overflow is counted.
+    """
+
+    def __init__(self, size=None):
+        self.size = get_default_adb_buffer_size() if size is None else size
+        self.buffer = bytearray()
+        self.start = 0
+        self.closed = False
+        self.overflows = 0
+        self.changed = asyncio.Condition()
+
+    @property
+    def end(self):
+        """Sequence number following the newest output"""
+        return self.start + len(self.buffer)
+
+    async def append(self, data):
+        """Add output, dropping the oldest if full, and wake up readers"""
+        self.buffer += data
+        excess = len(self.buffer) - self.size
+        if excess > 0:
+            del self.buffer[:excess]
+            self.start += excess
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def close(self):
+        """Mark the end of the output and wake up readers"""
+        self.closed = True
+        async with self.changed:
+            self.changed.notify_all()
+
+    def read(self, cursor):
+        """Returns (output after cursor, new cursor, number of bytes skipped)"""
+        skipped = max(0, self.start - cursor)
+        if skipped:
+            self.overflows += 1
+            cursor = self.start
+        return bytes(self.buffer[cursor - self.start:]), self.end, skipped
+
+    async def wait(self, cursor, timeout=0):
+        """Wait for output after cursor or the end of output.
+
+        Returns False if nothing came within timeout seconds (never if 0).
+        """
+        async with self.changed:
+            waiting = self.changed.wait_for(lambda: self.end > cursor or self.closed)
+            if timeout <= 0:
+                await waiting
+                return True
+            try:
+                await asyncio.wait_for(waiting, timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+
+class AdbShell:
+    """adb shell process shared by all clients of the daemon.
+
+    Commands are serialized with a lock, which asyncio hands over in FIFO order.
+    Output is kept in a ring buffer read by every client from its own cursor,
+    tailing clients included.
+    """
+
+    def __init__(self, serial, process):
+        self.serial = serial
+        self.process = process
+        self.lock = asyncio.Lock()
+        self.ring = OutputRing()
+        self.readers = 0
+        self.last_used = time.monotonic()
+        self.forward_task = asyncio.ensure_future(self.forward_output())
+
+    @classmethod
+    async def start(cls, serial=''):
+        """Run adb shell on the device with this serial, or the only device if empty"""
+        command_adb = ['adb', '-s', serial, 'shell'] if serial else ['adb', 'shell']
+        process = await asyncio.create_subprocess_exec(
+            *command_adb,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        print(f"Opened ADB session {serial}")
+        return cls(serial, process)
+
+    @property
+    def busy(self):
+        """Whether a command is running or a client is reading"""
+        return self.lock.locked() or self.readers > 0
+
+    async def close(self):
+        """Stop adb shell and wait for its output to be forwarded"""
+        await close_adb_shell(self.process)
+        await self.forward_task
+
+    async def forward_output(self):
+        """Copy adb shell output to the ring buffer"""
+        print(f'ABD handler started {self.serial}')
+        while True:
+            # Forward whatever is available, prompts and partial lines included
+            output = await self.process.stdout.read(4096)
+            if not output:
+                break
+            await self.ring.append(output)
+        await self.ring.close()
+        print(f'ABD handler stopped {self.serial}')
+
+    async def send(self, text, command_end=None):
+        """Send a command to adb shell, followed by the end marker if given"""
+        if command_end is not None:
+            text = command_end.wrap(text)
+        self.process.stdin.write(f"{text}\n".encode())
+        try:
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            print('Got no reply. Is ADB device connected?')
+
+    async def respond(self, responder, adb_timeout=1, command_end=None, cursor=None):
+        """Send output after cursor, by default from now on, to the client.
+
+        Stops when the command ended, when nothing arrived for adb_timeout seconds
+        since the last output (never if adb_timeout is 0), or when adb shell exited.
+        Returns the number of bytes the client missed because the buffer was full.
+        """
+        if cursor is None:
+            cursor = self.ring.end
+        # Undecodable bytes are escaped to be sent back unchanged to raw clients
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='surrogateescape')
+        dropped = 0
+        self.readers += 1
+        try:
+            while not command_end.done:
+                if not await self.ring.wait(cursor, adb_timeout):
+                    break
+                output, cursor, skipped = self.ring.read(cursor)
+                dropped += skipped
+                if not output:
+                    # adb shell exited
+                    break
+                response = command_end.feed(decoder.decode(output))
+                if response:
+                    await responder.data(response)
+            response = command_end.flush()
+            if response:
+                await responder.data(response)
+        finally:
+            self.readers -= 1
+        return dropped
+
+
+class CommandEnd:
+    """Finds the end of one command in adb shell output.
+
+    The command is followed by an echo of a unique marker and $?. The marker
+    line is removed from the output and its exit status is kept, the output
+    after it belongs to no command. Markers of earlier commands that timed out
+    are removed as well.
+    """
+    PREFIX = '__PYAUTOPORT_END_'
+    PATTERN = re.compile(r'__PYAUTOPORT_END_([0-9a-f]{32})__(\d+)\r?\n')
+    # Beginning of a marker line, once the PREFIX is complete
+    PARTIAL = re.compile(r'__PYAUTOPORT_END_(?:[0-9a-f]{0,31}|[0-9a-f]{32}(?:_|__(?:\d+\r?)?)?)\Z')
+
+    def __init__(self):
+        self.marker_id = uuid.uuid4().hex
+        self.pending = ''
+        self.exit_status = None
+        self.done = False
+
+    def wrap(self, text):
+        """Returns the command followed by the echo of the marker"""
+        return f"{text}\necho {self.PREFIX}{self.marker_id}__$?"
+
+    def feed(self, text):
+        """Returns the output that can be sent to the client"""
+        self.pending += text
+        output = ''
+        match = self.PATTERN.search(self.pending)
+        while match is not None:
+            output += self.pending[:match.start()]
+            self.pending = self.pending[match.end():]
+            if match.group(1) == self.marker_id:
+                self.exit_status = int(match.group(2))
+                self.done = True
+                self.pending = ''
+                return output
+            match = self.PATTERN.search(self.pending)
+        # Hold back what may be the beginning of a marker
+        hold = self.pending.rfind(self.PREFIX)
+        if hold >= 0 and not self.PARTIAL.match(self.pending, hold):
+            hold = -1
+        if hold < 0:
+            hold = len(self.pending)
+            for length in range(min(len(self.PREFIX) - 1, len(self.pending)), 0, -1):
+                if self.pending.endswith(self.PREFIX[:length]):
+                    hold -= length
+                    break
+        output += self.pending[:hold]
+        self.pending = self.pending[hold:]
+        return output
+
+    def flush(self):
+        """Returns the output held back when the command did not end"""
+        output, self.pending = self.pending, ''
+        return output
+
+
+class Responder:
+    """Writes the response frames of one request"""
+
+    def __init__(self, writer, request_id, reader=None):
+        self.writer = writer
+        self.request_id = request_id
+        self.reader = reader
+
+    @property
+    def disconnected(self):
+        """Whether the client closed the connection, it waits for nothing"""
+        return self.writer.is_closing() or (self.reader is not None and self.reader.at_eof())
+
+    async def start(self):
+        """Tell the client that the request runs, its timeout starts"""
+        self.writer.write(protocol.encode_frame(protocol.START, self.request_id))
+        await self.writer.drain()
+
+    async def data(self, text):
+        """Send output to the client"""
+        self.writer.write(protocol.encode_frame(
+            protocol.DATA, self.request_id, text.encode(errors='surrogateescape')
+        ))
+        await self.writer.drain()
+
+    async def end(self, **fields):
+        """Close the response with fields such as exit_status"""
+        self.writer.write(protocol.encode_fields(protocol.END, self.request_id, **fields))
+        await self.writer.drain()
+
+
+def get_default_adb_idle_timeout():
+    """Returns the time an unused adb shell is kept open in seconds.
+    Read from the TESTER_ADB_IDLE_TIMEOUT environment variable or defaulting to 600,
+    0 to keep them open."""
+    return float(os.environ.get("TESTER_ADB_IDLE_TIMEOUT", "600"))
+
+
+class AdbDaemon:
+    """Serves clients with one adb shell per device serial.
+
+    Shells are started on the first request for their serial and closed
+    after idle_timeout seconds without use, never if it is 0. Create it in the
+    event loop serving it, Python 3.8 and 3.9 bind its lock to the current loop.
+    """
+
+    def __init__(self, default_serial='', idle_timeout=None):
+        self.default_serial = default_serial
+        if idle_timeout is None:
+            idle_timeout = get_default_adb_idle_timeout()
+        self.idle_timeout = idle_timeout
+        self.shells = {}
+        self.lock = asyncio.Lock()
+        self.event_stop = asyncio.Event()
+
+    def write_pid_file(self):
+        """Record the processes to kill in case adb_close does not work"""
+        transport.make_private_dir(os.path.dirname(PID_FILE))
+        with open(PID_FILE, 'w', encoding='utf-8') as file:
+            for shell in self.shells.values():
+                file.write(f'{shell.process.pid}\n')
+            file.write(f'{os.getpid()}\n')
+
+    async def get_shell(self, serial=''):
+        """Returns the shell of a serial, starting it if necessary"""
+        serial = serial or self.default_serial
+        async with self.lock:
+            shell = self.shells.get(serial)
+            if shell is not None and shell.forward_task.done():
+                # adb shell exited, e.g. the device was unplugged
+                del self.shells[serial]
+                shell = None
+            if shell is None:
+                shell = await AdbShell.start(serial)
+                self.shells[serial] = shell
+                self.write_pid_file()
+        shell.last_used = time.monotonic()
+        return shell
+
+    async def close_shell(self, serial):
+        """Close the shell of a serial if it is open"""
+        async with self.lock:
+            shell = self.shells.pop(serial, None)
+            self.write_pid_file()
+        if shell is not None:
+            await shell.close()
+
+    async def close_idle_shells(self):
+        """Close shells nobody used for idle_timeout seconds"""
+        if self.idle_timeout <= 0:
+            return
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, 10))
+            for serial, shell in list(self.shells.items()):
+                if not shell.busy and time.monotonic() - shell.last_used > self.idle_timeout:
+                    await self.close_shell(serial)
+
+    async def handle_client(self, reader, writer):
+        """Serve the requests of one client, one after another"""
+        if not transport.peer_is_same_user(writer.get_extra_info('socket')):
+            print('Warning: refused a client of another user')
+            writer.close()
+            return
+        try:
+            while True:
+                frame = await protocol.read_frame(reader)
+                if frame is None:
+                    break
+                kind, request_id, payload = frame
+                if kind != protocol.REQUEST:
+                    raise protocol.ProtocolError(f'Expected a request, got frame kind {kind}')
+                await self.handle_request(
+                    protocol.decode_fields(payload), Responder(writer, request_id, reader)
+                )
+        except protocol.ProtocolError as e:
+            print(f'Warning: {e}')
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, fields, responder):
+        """Serve one request.
+
+        Fields are command ('send', 'send_raw' without end marker, 'tail' or
+        'exit'), text, timeout and serial. Exit with a serial only closes its shell.
+        """
+        command = fields.get('command', 'send')
+        text = fields.get('text', '')
+        adb_timeout = float(fields.get('timeout', 1))
+        serial = fields.get('serial') or ''
+        # Close if received exit
+        if command == 'exit' or text == 'exit':
+            await responder.data("Stopping ADB\n")
+            await responder.end()
+            if serial:
+                await self.close_shell(serial)
+            else:
+                self.event_stop.set()
+            return
+        shell = await self.get_shell(serial)
+        # Without marker of its own, it still removes the markers of other commands
+        command_end = CommandEnd()
+        if command == 'tail':
+            # Read-only, does not wait for other clients
+            await responder.start()
+            dropped = await shell.respond(responder, adb_timeout, command_end)
+        else:
+            async with shell.lock:
+                if responder.disconnected:
+                    # The client gave up while waiting, its command is not run
+                    return
+                await responder.start()
+                # Only output printed after the command was sent belongs to it
+                cursor = shell.ring.end
+                await shell.send(text, command_end if command == 'send' else None)
+                dropped = await shell.respond(responder, adb_timeout, command_end, cursor)
+        shell.last_used = time.monotonic()
+        await responder.end(exit_status=command_end.exit_status, dropped=dropped)
+
+    async def serve(self):
+        """Serve clients until asked to stop"""
+        # Set daemon socket
+        server_socket = transport.create_server_socket('adb', PORT_ABD_WRITE)
+        address = server_socket.getsockname()
+        print(f"Server listening on {transport.describe(server_socket)}")
+        server = await asyncio.start_server(self.handle_client, sock=server_socket)
+        self.write_pid_file()
+        idle_task = asyncio.ensure_future(self.close_idle_shells())
+
+        await self.event_stop.wait()
+        server.close()
+        idle_task.cancel()
+        for serial in list(self.shells):
+            await self.close_shell(serial)
+        await server.wait_closed()
+        transport.remove_socket_file(address)
+        try:
+            os.remove(PID_FILE)
+        except FileNotFoundError:
+            pass
+
 
-    while time.time() - last_update <= adb_timeout:
-        time.sleep(0.5)
-        response = ""
-        while QUEUE_ADB_OUTPUT.qsize() > 0:
-            response += QUEUE_ADB_OUTPUT.get()
-            last_update = time.time()
-        client_socket.send(response.encode())
+async def serve_adb_daemon(default_serial):
+    """Create the daemon in the event loop and serve clients until asked to stop"""
+    await AdbDaemon(default_serial).serve()
 
 
 def start_adb_daemon():
     """Main thread to handle ADB"""
-    adb_timeout = 1
-
-    # Set daemon socket
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server_socket.bind(('localhost', PORT_ABD_WRITE))
-    server_socket.listen(5)
-    print(f"Server listening on port {PORT_ABD_WRITE}")
-
-    try:
-        command_adb = ['adb', '-s', os.environ["TESTER_ABD_SERIAL"], 'shell']
+    default_serial = os.environ.get("TESTER_ABD_SERIAL", '')
+    if default_serial:
         print(f'''
-Listening to {os.environ["TESTER_ABD_SERIAL"]} only.
-Run adb_close and change device id using:
+Using {default_serial} by default.
+Other devices can be used with adb_send -s SERIAL, or change the default
+device by running adb_close and:
 export TESTER_ABD_SERIAL=XXX (On Linux)
 set TESTER_ABD_SERIAL=XXX (For Windows CMD (Command Prompt))
 $Env:TESTER_ABD_SERIAL = 'XXX' (For Windows PowerShell)
         ''')
-    except KeyError:
-        command_adb = ['adb', 'shell']
+    else:
         print('''
-You may specify ADB device id by running adb_close and set:
+You may specify ADB device id with adb_send -s SERIAL, or set the default
+device by running adb_close and:
 export TESTER_ABD_SERIAL=XXX (On Linux)
 set TESTER_ABD_SERIAL=XXX (For Windows CMD (Command Prompt))
 $Env:TESTER_ABD_SERIAL = 'XXX' (For Windows PowerShell)
         ''')
 
-    with subprocess.Popen(
-        command_adb,
-        stdin=subprocess.PIPE, stdout=subprocess.PIPE
-    ) as adb_session:
-        adb_session_thread = threading.Thread(
-            target=output_adb_stdout,
-            args=(adb_session,)
-        )
-        adb_session_thread.start()
-        with open(PID_FILE, 'w', encoding='utf-8') as file:
-            file.write(f'{adb_session.pid}\n')
-            file.write(f'{os.getpid()}\n')
-        print("Opened ADB session")
-
-        while adb_session is not None:
-            client_socket, _ = server_socket.accept()
-            # Receive data from the client
-            ready = select.select([client_socket], [], [], 0.25)
-            while ready[0]:
-                data = client_socket.recv(1024).decode().strip()
-                ready = select.select([client_socket], [], [], 0.25)
-
-            if len(data) > 2 and data[0:2] == "it":
-                data_index = data.find("@")
-                # Set timeout if possible
-                try:
-                    adb_timeout = float(data[2:data_index])
-                except (ValueError, IndexError) as e:
-                    print(f'Waring: {e} when converting timeout')
-                    adb_timeout = 1
-                data = data[data_index:]
-            elif data[0:1] == "@":
-                # Move to sending command via ADB
-                pass
-
-            # Close if received exit
-            if data[1:] == "exit":
-                client_socket.send("Stopping ADB\n".encode())
-                client_socket.close()
-                close_adb_shell(adb_session)
-                return
-
-            # Send command via ADB
-            adb_session.stdin.write(f"{data[1:]}\n".encode())
-            try:
-                adb_session.stdin.flush()
-            except BrokenPipeError:
-                print('Got no reply. Is ADB device connected?')
-
-            try:
-                read_and_respond_until_timeout(client_socket, adb_timeout)
-            except (ConnectionResetError, BrokenPipeError):
-                pass
-            client_socket.close()
+    asyncio.run(serve_adb_daemon(default_serial))
 
 
 # Force kill processes on signal:
@@ -195,33 +529,161 @@ def force_kill_adb_shell():
 
 
 # Handling stopping process
-def close_adb_shell(adb_session):
+async def close_adb_shell(adb_session):
     """Close ADB peacefully"""
-    # Stop output thread
-    EVENT_STOP_ADB_SESSION.set()
-    if adb_session is not None and adb_session.poll() is None:
+    if adb_session is not None and adb_session.returncode is None:
         adb_session.terminate()
         try:
-            adb_session.wait(timeout=1)
-        except subprocess.TimeoutExpired:
+            await asyncio.wait_for(adb_session.wait(), 1)
+        except asyncio.TimeoutError:
             adb_session.kill()
+            await adb_session.wait()
             print('Killed adb_session')
         print('Terminated adb_session')
-    try:
-        os.remove(PID_FILE)
-    except FileNotFoundError:
-        pass
 
 
-# ADB handler
-def output_adb_stdout(adb_session=None):
-    """Copy adb shell output to queue"""
-    # Read and print all lines until timeout
-    print('ABD handler started')
-    while not EVENT_STOP_ADB_SESSION.is_set() and adb_session is not None:
-        line = adb_session.stdout.readline().decode()
-        QUEUE_ADB_OUTPUT.put(line)
-    print('ABD handler stopped')
+# Client
+REQUEST_IDS = itertools.count(1)
+
+
+class AdbResponse:
+    """Response of the daemon to one request.
+
+    Iterating yields the output as it arrives, as bytes if raw or str otherwise.
+    The timeout starts once the daemon runs the request, after the requests sent
+    before it to the same device. Once done, exit_status holds the exit status
+    of the command, or None if it is unknown, and dropped the number of output
+    bytes lost because the daemon buffer overflowed.
+    Raises ConnectionRefusedError if the daemon is not running, TimeoutError or
+    ConnectionResetError if the response stops before its end.
+    """
+
+    def __init__(self, fields, adb_timeout=1, raw=False):
+        self.fields = fields
+        self.adb_timeout = adb_timeout
+        self.raw = raw
+        self.exit_status = None
+        self.dropped = 0
+
+    @property
+    def frame_timeout(self):
+        """Time to wait for the next frame once the request runs, None for ever"""
+        return self.adb_timeout + 1 if self.adb_timeout > 0 else None
+
+    def request(self):
+        """Returns the request frame, with a new request id"""
+        return protocol.encode_fields(protocol.REQUEST, next(REQUEST_IDS), **self.fields)
+
+    def decoder(self):
+        """Returns a function turning DATA payloads into output"""
+        if self.raw:
+            return bytes
+        return codecs.getincrementaldecoder('utf-8')(errors='replace').decode
+
+    def timeout_error(self):
+        """Returns the error of a response the daemon stopped sending"""
+        return TimeoutError(f'No response from the ADB daemon for {self.frame_timeout} seconds')
+
+    @staticmethod
+    def closed_error():
+        """Returns the error of a response the daemon closed before its end"""
+        return ConnectionResetError('ADB daemon closed the connection before the response ended')
+
+    def end(self, payload):
+        """Keep the fields of the END frame"""
+        fields = protocol.decode_fields(payload)
+        self.exit_status = fields.get('exit_status')
+        self.dropped = fields.get('dropped', 0)
+
+    def __iter__(self):
+        with transport.connect('adb', PORT_ABD_WRITE) as client_socket:
+            # Send data to the daemon
+            client_socket.sendall(self.request())
+
+            # Receive the response from the daemon until its end frame
+            decode = self.decoder()
+            while True:
+                try:
+                    frame = protocol.recv_frame(client_socket)
+                except socket.timeout as e:
+                    raise self.timeout_error() from e
+                if frame is None:
+                    raise self.closed_error()
+                kind, _, payload = frame
+                if kind == protocol.START:
+                    client_socket.settimeout(self.frame_timeout)
+                    continue
+                if kind == protocol.END:
+                    self.end(payload)
+                    break
+                output = decode(payload)
+                if output:
+                    yield output
+
+    def read(self):
+        """Returns the whole output"""
+        return (b'' if self.raw else '').join(self)
+
+    async def read_async(self):
+        """Returns the whole output, waiting on the running event loop"""
+        outputs = []
+        reader, writer = await transport.open_connection('adb', PORT_ABD_WRITE)
+        try:
+            writer.write(self.request())
+            await writer.drain()
+            decode = self.decoder()
+            timeout = None
+            while True:
+                try:
+                    frame = await asyncio.wait_for(protocol.read_frame(reader), timeout)
+                except asyncio.TimeoutError as e:
+                    raise self.timeout_error() from e
+                if frame is None:
+                    raise self.closed_error()
+                kind, _, payload = frame
+                if kind == protocol.START:
+                    timeout = self.frame_timeout
+                    continue
+                if kind == protocol.END:
+                    self.end(payload)
+                    break
+                outputs.append(decode(payload))
+        finally:
+            writer.close()
+        return (b'' if self.raw else '').join(outputs)
+
+    def warn_dropped(self):
+        """Tell on stderr if output was lost"""
+        if self.dropped:
+            print(
+                f'Warning: {self.dropped} bytes of output were dropped, '
+                'increase TESTER_ADB_BUFFER_SIZE',
+                file=sys.stderr
+            )
+
+
+# pylint: disable-next=too-many-arguments
+def send_request(text, adb_timeout=1, wait_exit=True, serial=None, raw=False):
+    """Returns the AdbResponse of a command.
+
+    With wait_exit the response ends as soon as the command ended, and carries its
+    exit status. Without, it ends after adb_timeout seconds without output, which
+    is needed for interactive programs reading the following commands.
+    The command is sent to the device with this serial, or the default device.
+    The output is bytes if raw, str otherwise.
+    """
+    return AdbResponse({
+        'command': 'send' if wait_exit else 'send_raw',
+        'text': text, 'timeout': adb_timeout, 'serial': serial,
+    }, adb_timeout, raw)
+
+
+def tail_request(adb_timeout=0, serial=None):
+    """Returns the AdbResponse following the output of the device with this serial"""
+    return AdbResponse(
+        {'command': 'tail', 'timeout': adb_timeout, 'serial': serial}, adb_timeout
+    )
+
 
 # PUBLIC API
 
@@ -235,83 +697,139 @@ def adb_send_via_bash():
         '-t', '--timeout', type=float,
         help='Time to wait before stop reading'
     )
+    parser.add_argument(
+        '--no-wait-exit', action='store_false', dest='wait_exit',
+        help='Do not wait for the command to end, only for the timeout (interactive programs)'
+    )
+    parser.add_argument(
+        '-s', '--serial',
+        help='Serial number of the device, see adb devices'
+    )
     args = parser.parse_args()
 
     # Combine text argument into a single string
     text = ' '.join(args.text)
 
-    # Send to ADB process stdin and read stdout
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    try:
-        client_socket.connect(('localhost', PORT_ABD_WRITE))
-    except ConnectionRefusedError:
-        print('Did you run adb_open&')
-        return
-
     # Set adb_timeout if necessary
     if args.timeout is not None:
         adb_timeout = args.timeout
     else:
         adb_timeout = 1
 
-    # Send data to the daemon
-    client_socket.send(f"it{adb_timeout}@{text}\n".encode())
+    # Send to ADB process stdin and read stdout
+    response = send_request(text, adb_timeout, args.wait_exit, args.serial)
+    try:
+        for output in response:
+            print(output, end="", flush=True)
+    except ConnectionRefusedError:
+        print('Did you run adb_open&')
+        sys.exit(1)
+    except (TimeoutError, ConnectionResetError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        sys.exit(1)
+    response.warn_dropped()
+    # Exit with the exit status of the command
+    if response.exit_status is not None:
+        sys.exit(response.exit_status)
+    if args.wait_exit:
+        # Not a success, the command may still be running or the device be missing
+        sys.exit(EXIT_STATUS_TIMEOUT)
+
+
+def adb_tail_via_bash():
+    """Bash entry for following ADB output without sending commands"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-t', '--timeout', type=float, default=0,
+        help='Time to wait before stop reading, 0 to follow until Ctrl-C'
+    )
+    parser.add_argument(
+        '-s', '--serial',
+        help='Serial number of the device, see adb devices'
+    )
+    args = parser.parse_args()
 
-    # Receive the response from the daemon
-    ready = select.select([client_socket], [], [], adb_timeout + 1)
-    while ready[0]:
-        response = client_socket.recv(1024)
-        if not response:
-            break
-        response = response.decode()
-        print(response, end="")
-        ready = select.select([client_socket], [], [], adb_timeout + 1)
+    response = tail_request(args.timeout, args.serial)
+    try:
+        for output in response:
+            print(output, end="", flush=True)
+    except ConnectionRefusedError:
+        print('Did you run adb_open&')
+    except (TimeoutError, ConnectionResetError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    response.warn_dropped()
 
-    client_socket.close()
 
+def adb_close(serial=None):
+    """Python and Shell entry for closing ADB.
 
-def adb_close():
-    """Python and Shell entry for closing ADB"""
+    Only the shell of the device with this serial is closed if given,
+    otherwise all shells and the daemon are.
+    """
     try:
-        # Send to ADB process stdin and read stdout
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        client_socket.connect(('localhost', PORT_ABD_WRITE))
-        # Send data to the daemon
-        client_socket.send("texit".encode())
-        # Receive the response from the daemon
-        response = client_socket.recv(1024).decode()
-        print(response)
-        client_socket.close()
+        for output in AdbResponse({'command': 'exit', 'serial': serial}):
+            print(output)
     except (
-        InterruptedError, ConnectionResetError, ConnectionRefusedError
+        InterruptedError, ConnectionResetError, ConnectionRefusedError, TimeoutError
     ) as e:
         print(f'Warning: {e} happened when closing socket')
 
 
-def adb_send(text, adb_timeout=1):
-    """Python entry for ADB communication"""
-    # Send to ADB process stdin and read stdout
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    try:
-        client_socket.connect(('localhost', PORT_ABD_WRITE))
-    except ConnectionRefusedError:
-        print('Did you run adb_open()')
-        return
-
-    # Send data to the daemon
-    client_socket.send(f"it{adb_timeout}@{text}\n".encode())
-
-    # Receive the response from the daemon
-    ready = select.select([client_socket], [], [], adb_timeout + 1)
-    while ready[0]:
-        response = client_socket.recv(1024)
-        if not response:
-            break
-        response = response.decode()
-        print(response, end="")
-        ready = select.select([client_socket], [], [], adb_timeout + 1)
-
-    client_socket.close()
+def adb_close_via_bash():
+    """Bash entry for closing ADB"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-s', '--serial',
+        help='Only close the shell of this device, keep the daemon running'
+    )
+    args = parser.parse_args()
+    adb_close(args.serial)
+
+
+# pylint: disable-next=too-many-arguments
+def adb_send(text, adb_timeout=1, wait_exit=True, serial=None, *, raw=False, with_status=False):
+    """Python entry for ADB communication.
+
+    Returns the output of the command, as bytes if raw or str otherwise, or
+    (output, exit status) with with_status. The exit status is None if it is
+    unknown. See send_request for wait_exit and serial.
+    Raises ConnectionRefusedError if the daemon is not running, TimeoutError or
+    ConnectionResetError if its response was lost, see AdbResponse.
+    """
+    response = send_request(text, adb_timeout, wait_exit, serial, raw)
+    output = response.read()
+    response.warn_dropped()
+    return (output, response.exit_status) if with_status else output
+
+
+# pylint: disable-next=too-many-arguments
+async def adb_send_async(
+    text, adb_timeout=1, wait_exit=True, serial=None, *, raw=False, with_status=False
+):
+    """Python entry for ADB communication from asyncio.
+
+    Same as adb_send, but waits on the running event loop instead of blocking,
+    so that many commands can be sent to several devices at once:
+
+        outputs = await asyncio.gather(*(
+            adb_send_async('getprop ro.build.id', serial=serial) for serial in serials
+        ))
+    """
+    response = send_request(text, adb_timeout, wait_exit, serial, raw)
+    output = await response.read_async()
+    response.warn_dropped()
+    return (output, response.exit_status) if with_status else output
+
+
+def adb_tail(adb_timeout=0, serial=None):
+    """Python entry for following ADB output without sending commands.
+
+    Yields the output as it arrives, until adb_timeout seconds without output
+    (never if 0). Does not wait for commands sent by other clients.
+    """
+    yield from tail_request(adb_timeout, serial)
 
 
 def adb_open():
@@ -35,3 +35,5 @@ Load all addon functions by default
 from .adb import *
 from .tty import *
 from .addon import *
+from .matcher import *
+from .logwriter import *
@@ -38,68 +38,60 @@ import threading
 import signal
 from queue import Queue
 from pyautoport.addon.addon import AddonStrategy
+from pyautoport.addon.logwriter import LogWriter, check_log_options, write_log_header
 
 # pylint: disable=duplicate-code
-class ADBStrategy(AddonStrategy):
-    """ Connection via adb """
-    log_file = 'adb.log'
-    save_log = False
-    data = Queue()
-    adb_event = threading.Event()
-
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(ADBStrategy, cls).__new__(cls)
-        return cls._instance
-
-    def __init__(self):
-        if self._first_init:
-            self.timeout = 1
-            self.thread = None
-            self.running = False
-            self.cmd = 'adb shell'
-            ADBStrategy._first_init = False
-            self.read = {"exist": False, "find": '', "found": ''}
+class ADBStrategy(AddonStrategy):  # pylint: disable=too-many-instance-attributes
+    """ Connection via adb, logged to <name>.log by default """
+
+    def __init__(self, name='adb'):
+        super().__init__(name)
+        self.timeout = 1
+        self.serial_port = ''
+        self.data = Queue()
+        self.adb_event = threading.Event()
 
     def _start_thread(self):
         self.running = True
+        # A fresh queue, so that the stop of the previous connection is not seen
+        self.data = Queue()
         self.adb_event.clear()
+        self.ready.clear()
         self.thread = threading.Thread(target=self._create_process)
         self.thread.daemon = True
         self.thread.start()
+        self.ready.wait(timeout=5)
 
     def _stop_thread(self):
         self.running = False
-        while self.adb_event.is_set():
-            time.sleep(0.1)
+        self.ready.clear()
+        # Wakes up the writer and read_data
+        self.data.put(None)
+        self.wake_waiters()
         if self.thread:
-            self.thread.join(timeout=1)
+            # Ends once adb shell is killed and its output read
+            self.thread.join()
 
     def _create_process(self):
+        cmd = 'adb -s ' + str(self.serial_port) + ' shell' if self.serial_port else 'adb shell'
         self.adb_event.set()
         if os.name == 'posix':
             with subprocess.Popen(
-                    self.cmd,
+                    cmd,
                     shell=True,
                     stdin=subprocess.PIPE,
                     stdout=subprocess.PIPE,
                     start_new_session=True
             ) as port:
                 self._read_and_write(port)
-                os.killpg(os.getpgid(port.pid), signal.SIGTERM)
         if os.name == 'nt':
             with subprocess.Popen(
-                    self.cmd,
+                    cmd,
                     shell=False,
                     stdin=subprocess.PIPE,
                     stdout=subprocess.PIPE
             ) as port:
                 self._read_and_write(port)
-                subprocess.run(
-                        ['taskkill', '/T', '/F', '/PID', str(port.pid)],
-                        timeout=2,
-                        check=False
-                    )
         self.adb_event.clear()
 
     def _read_and_write(self, port):
@@ -107,75 +99,103 @@ class ADBStrategy(AddonStrategy):
         read_thread.daemon = True
         read_thread.start()
         self._write(port)
+        self._kill(port)
+        # The reader stops at the end of output of the killed process
         read_thread.join(timeout=1)
 
+    @staticmethod
+    def _kill(port):
+        if os.name == 'posix':
+            try:
+                os.killpg(os.getpgid(port.pid), signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        if os.name == 'nt':
+            subprocess.run(
+                    ['taskkill', '/T', '/F', '/PID', str(port.pid)],
+                    timeout=2,
+                    check=False
+                )
+
     def _write(self, port):
-        while self.running:
-            while self.data.qsize() > 0:
-                write_data = self.data.get()
-                if port.stdin.closed:
+        """ write queued data until None is queued """
+        while True:
+            chunks = [self.data.get()]
+            # Write everything queued meanwhile in one go
+            while chunks[-1] is not None and not self.data.empty():
+                chunks.append(self.data.get_nowait())
+            stop = chunks[-1] is None
+            if stop:
+                chunks.pop()
+            if chunks:
+                try:
+                    port.stdin.write(b''.join(chunks))
+                    port.stdin.flush()
+                except (OSError, ValueError):
                     print('process of [adb shell] was exited\n')
                     self.running = False
-                    break
-                port.stdin.write(write_data)
-                port.stdin.flush()
+                    return
+            if stop:
+                return
 
     def _read(self, port):
         has_message = False
-        with open(self.log_file, 'a', encoding='utf-8', errors='ignore') as f:
+        with LogWriter(self.log_file, **self.log_options) as f:
+            # The disk is written by the thread of f, not this one
+            self.log_writer = f
+            self.ready.set()
             while self.running:
                 read_data = ''
                 if port.stdout.closed:
                     print('process of [adb shell] was exited\n')
                     self.running = False
+                    self.wake_waiters()
                     break
                 read_data = port.stdout.readline().decode(encoding='utf-8', errors='ignore')
                 if read_data:
+                    self.match_line(read_data)
                     if self.timestamp and has_message:
                         time_stamp = time.time()
                         read_data = '[' + str(time_stamp) + '] ' + read_data
                     if has_message:
                         print(read_data.strip())
-                    f.write(read_data.replace('\r\n', '\n').replace('\r', ''))
-                    f.flush()
+                    f.write(read_data)
                     has_message = True
-                    if self.read["find"] != '' and self.read["find"] in read_data:
-                        self.read["exist"] = True
-                        self.read["found"] = read_data.replace('\r\n', '\n').replace('\r', '')
-                        self.read['find'] = ''
                 else:
                     has_message = False
                     time.sleep(0.1)
+            self.log_writer = None
 
     def set_timeout(self, timeout):
         """ set timeout in adb session """
         self.timeout = timeout
 
-    def set_log(self, log_file='adb.log', save_flag=True):
+    def set_log(self, log_file=None, save_flag=True, **log_options):
         """ set logstart in adb session """
+        log_options = check_log_options(**log_options)
         if self.running:
             self.disconnect()
-        serial_port = os.environ.get('TESTER_ADB_PORT', '')
-        self.log_file = log_file
+        self.log_file = log_file or f'{self.name}.log'
         self.save_log = save_flag
-        self.connect(serial_port=serial_port)
-        with open(self.log_file, 'w', encoding='utf-8', errors='ignore') as f:
-            f.write(f'>>>>>>>>>> adb log start, port={serial_port}\n')
+        self.log_options = log_options
+        write_log_header(
+            self.log_file, f'>>>>>>>>>> adb log start, port={self.serial_port}\n', log_options
+        )
+        # Reopen the same device
+        self.connect(serial_port=self.serial_port)
 
     def connect(self, serial_port=''):
         """ connect via adb """
         if self.running:
             self.disconnect()
-        if serial_port != '':
-            self.cmd = 'adb -s ' + str(serial_port) + ' shell'
+        self.serial_port = serial_port
         self._start_thread()
 
     def send_data(self, data):
         """ send commands via adb session """
         if self.adb_event.is_set():
-            self.data.put(data.encode('utf-8'))
-            self.data.put('\n'.encode('utf-8'))
-            time.sleep(0.05)
+            self.mark_sent()
+            self.data.put(f'{data}\n'.encode('utf-8'))
         else:
             print('connect_adb failed,'
                 'Please make sure execute connect adb before')
@@ -186,30 +206,11 @@ class ADBStrategy(AddonStrategy):
             print('Cannot send data to log file,'
                 'Please execute logstart before')
         else:
-            with open(self.log_file, 'ab') as f:
-                f.write(data.encode('utf-8'))
-                f.write('\n'.encode('utf-8'))
-
-    def read_data(self, data):
-        """ read data via adb session """
-        start_time = time.time()
-        self.read = {"exist": False, "find": data, "found": ''}
-        while self.running:
-            if self.read["exist"]:
-                print(f'>>>>>>>>>> Found message: {self.read["found"]}')
-                return True
-            current_time = time.time() - start_time
-            if current_time >= self.timeout:
-                print('>>>>>>>>>> Not Found message, Timeout occureed!!!')
-                return False
-        print('>>>>>>>>>> Read log Thread not exist, Please check it.')
-        return False
+            self.write_log(f'{data}\n')
 
     def disconnect(self):
         """ disconnect from adb """
         if self.running:
             self._stop_thread()
-            time.sleep(0.3)
         if not self.save_log and os.path.exists(self.log_file):
-            time.sleep(0.3)
             os.remove(self.log_file)
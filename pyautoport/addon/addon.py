@@ -31,20 +31,131 @@
 TeraTerm Mode - abstractmethod
 """
 
+import collections
+import os
+import threading
+import time
 from abc import ABC, abstractmethod
+from pyautoport.addon.logwriter import check_log_options
+from pyautoport.addon.matcher import Matcher
 
-class AddonStrategy(ABC):
-    """ abstractmethod for session """
-    _instance = None
-    _first_init = True
-    timestamp = False
+# Lines, or parts of lines, kept by each connection for waitln
+HISTORY_LINES = int(os.environ.get('TESTER_HISTORY_LINES', '1000'))
+
+class AddonStrategy(ABC):  # pylint: disable=too-many-instance-attributes
+    """ abstractmethod for session, one instance per connection """
+
+    def __init__(self, name):
+        self.name = name
+        self.log_file = f'{name}.log'
+        self.save_log = False
+        # LogWriter options, and the LogWriter of the running reader
+        self.log_options = check_log_options()
+        self.log_writer = None
+        self.timestamp = False
+        self.thread = None
+        self.running = False
+        # Set once the connection is open and the reader started
+        self.ready = threading.Event()
+        # Matcher of the pending read_data, fed by the reader, and its Match
+        self.matcher = None
+        self.match = None
+        # Notified by the reader when match is set or the reader stops
+        self.condition = threading.Condition()
+        self.timeout = 1
+        # Recent output as (number, arrival time, text), and the number of the
+        # next text received
+        self.history = collections.deque(maxlen=HISTORY_LINES)
+        self.received = 0
+        # read_data searches from this number by default, set by send_data and
+        # moved after each match
+        self.cursor = 0
+
+    def match_line(self, line):
+        """ called by the reader for each line or part of line received,
+        wakes up read_data on a match """
+        with self.condition:
+            self.history.append((self.received, time.time(), line))
+            self.received += 1
+            if self.matcher is None:
+                return
+            self.match = self.matcher.feed(line)
+            if self.match:
+                self.matcher = None
+                self.cursor = self.received
+                self.condition.notify_all()
+
+    def mark_sent(self):
+        """ called by send_data before sending, read_data searches from there """
+        with self.condition:
+            self.cursor = self.received
+
+    def history_since(self, since):
+        """ returns the history since the last send or match ('send'), since
+        the call ('now') or of the last since seconds """
+        if since == 'send':
+            return [item for item in self.history if item[0] >= self.cursor]
+        if since == 'now':
+            return []
+        try:
+            start = time.time() - float(since)
+        except ValueError as e:
+            raise ValueError(f'Invalid since: {since}, use send, now or seconds') from e
+        return [item for item in self.history if item[1] >= start]
+
+    def wake_waiters(self):
+        """ called when the reader stops, so that read_data does not wait for nothing """
+        with self.condition:
+            self.condition.notify_all()
+
+    def read_data(self, data, since='send'):
+        """ wait up to timeout for a line containing data, a string or compiled
+        regex or a list of them, searching first the output received since,
+        see history_since. Returns the Match of the first one received, None
+        on timeout """
+        patterns = data if isinstance(data, (list, tuple)) else [data]
+        matcher = Matcher(patterns)
+        log_writer = self.log_writer
+        if log_writer and log_writer.flush_policy == 'wait':
+            log_writer.flush()
+        with self.condition:
+            self.match = None
+            for number, _, text in self.history_since(since):
+                self.match = matcher.feed(text)
+                if self.match:
+                    self.cursor = number + 1
+                    break
+            else:
+                self.matcher = matcher
+                self.condition.wait_for(
+                    lambda: self.match is not None or not self.running, self.timeout
+                )
+                self.matcher = None
+            match = self.match
+        if match:
+            print(f'>>>>>>>>>> Found message: {match.line}')
+            return match
+        if self.running:
+            print('>>>>>>>>>> Not Found message, Timeout occureed!!!')
+        else:
+            print('>>>>>>>>>> Read log Thread not exist, Please check it.')
+        return None
 
     @abstractmethod
     def set_timeout(self, timeout):
         """ abstractmentod for set timeout """
 
+    def write_log(self, data):
+        """ append data to the log, after the output queued before """
+        log_writer = self.log_writer
+        if log_writer:
+            log_writer.write(data, block=True)
+        else:
+            with open(self.log_file, 'a', encoding='utf-8', errors='ignore') as f:
+                f.write(data)
+
     @abstractmethod
-    def set_log(self, log_file, save_flag):
+    def set_log(self, log_file, save_flag, **log_options):
         """ abstractmentod for set logstart/logstop """
 
     @abstractmethod
@@ -59,10 +170,6 @@ class AddonStrategy(ABC):
     def send_data_to_log(self, data):
         """ abstractmentod for send date to logfile """
 
-    @abstractmethod
-    def read_data(self, data):
-        """ abstractmentod for read data """
-
     @abstractmethod
     def disconnect(self):
         """ abstractmentod for disconnect """
@@ -0,0 +1,376 @@
+# Copyright 2023 Sony Corporation
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+TeraTerm Mode - log writer
+"""
+
+import gzip
+import lzma
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+
+# When the log file is flushed: after each batch of lines, every interval
+# seconds, or only when waitln waits and when the log is closed
+FLUSH_POLICIES = ('line', 'interval', 'wait')
+# Lines queued before they are dropped, and characters written at once
+LOG_QUEUE_LINES = 10000
+LOG_BATCH_SIZE = 65536
+# Seconds between checks that the writer thread is still running while waiting for it
+LOG_WAIT_STEP = 0.1
+# Compression of rotated logs: (file suffix, open function)
+COMPRESSIONS = {'gzip': ('.gz', gzip.open), 'lzma': ('.xz', lzma.open)}
+SIZE_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+def parse_size(size):
+    """ returns the number of bytes of size, such as 1048576, '512K' or '100M' """
+    match = re.fullmatch(r'\s*(\d+)\s*([KMG]?)B?\s*', str(size), re.IGNORECASE)
+    if not match:
+        raise ValueError(f'Invalid size: {size}')
+    return int(match.group(1)) * SIZE_UNITS[match.group(2).upper()]
+
+
+def check_log_options(*, flush='line', interval=1.0, fsync=False,  # pylint: disable=too-many-arguments
+                      rotate_size=0, rotate_interval=0, compress='none', keep=0, **unknown):
+    """ returns the LogWriter options, raises ValueError if invalid """
+    if unknown:
+        raise ValueError(f'Unknown log options: {", ".join(unknown)}')
+    if flush not in FLUSH_POLICIES:
+        raise ValueError(f'Invalid flush policy: {flush}, use {", ".join(FLUSH_POLICIES)}')
+    interval = float(interval)
+    if interval <= 0:
+        raise ValueError(f'Invalid flush interval: {interval}')
+    if compress != 'none' and compress not in COMPRESSIONS:
+        raise ValueError(f'Invalid compression: {compress}, use none, {", ".join(COMPRESSIONS)}')
+    options = {
+        'flush': flush, 'interval': interval, 'fsync': bool(fsync),
+        'rotate_size': parse_size(rotate_size), 'rotate_interval': float(rotate_interval),
+        'compress': compress, 'keep': int(keep),
+    }
+    if options['rotate_interval'] < 0 or options['keep'] < 0:
+        raise ValueError('Invalid rotation: rotate_interval and keep cannot be negative')
+    return options
+
+
+def write_log_header(path, header, options):
+    """ start the log file with header, truncating it unless it is rotated """
+    rotated = options['rotate_size'] or options['rotate_interval']
+    with open(path, 'a' if rotated else 'w', encoding='utf-8', errors='ignore') as f:
+        f.write(header)
+
+
+class LogRotator:
+    """ renames a full log to <log>.<number>, 1 for the oldest, then
+    compresses it and removes the oldest ones from its own thread """
+
+    def __init__(self, path, compress='none', keep=0):
+        self.path = path
+        self.compress = compress
+        self.keep = keep
+        self.number = max((number for number, _ in self.segments()), default=0)
+        # Rotated log to compress, or None to stop
+        self.queue = queue.Queue()
+        self.thread = None
+
+    def segments(self):
+        """ returns [(number, path)] of the rotated logs, the oldest first """
+        directory = os.path.dirname(self.path) or '.'
+        pattern = re.compile(re.escape(os.path.basename(self.path)) + r'\.(\d+)(\.gz|\.xz)?')
+        segments = []
+        for name in os.listdir(directory):
+            match = pattern.fullmatch(name)
+            if match:
+                segments.append((int(match.group(1)), os.path.join(directory, name)))
+        return sorted(segments)
+
+    def rotate(self):
+        """ rename the log, closed by the caller, and queue its compression """
+        self.number += 1
+        segment = f'{self.path}.{self.number}'
+        try:
+            os.replace(self.path, segment)
+        except FileNotFoundError:
+            return
+        if self.thread is None:
+            # Not a daemon, so that exiting waits for the compression to end
+            self.thread = threading.Thread(target=self._run)
+            self.thread.start()
+        self.queue.put(segment)
+
+    def close(self):
+        """ stop once the rotated logs are compressed, without waiting """
+        if self.thread:
+            self.queue.put(None)
+
+    def _run(self):
+        while True:
+            segment = self.queue.get()
+            if segment is None:
+                return
+            try:
+                # Already removed if older than the last keep ones
+                if os.path.exists(segment):
+                    self._compress(segment)
+                self._remove_old()
+            except OSError as e:
+                print(f'Warning: {e} happened when rotating {self.path}')
+
+    def _compress(self, segment):
+        """ replace segment by its compressed copy """
+        if self.compress not in COMPRESSIONS:
+            return
+        suffix, open_compressed = COMPRESSIONS[self.compress]
+        # Not seen by segments until complete
+        partial = f'{segment}{suffix}.partial'
+        with open(segment, 'rb') as source, open_compressed(partial, 'wb') as target:
+            shutil.copyfileobj(source, target, 1 << 20)
+        os.replace(partial, segment + suffix)
+        os.remove(segment)
+
+    def _remove_old(self):
+        """ keep the last keep rotated logs, all if 0 """
+        if not self.keep:
+            return
+        for _, segment in self.segments()[:-self.keep]:
+            try:
+                os.remove(segment)
+            except FileNotFoundError:
+                pass
+
+
+class LogWriter:  # pylint: disable=too-many-instance-attributes
+    """ appends text to a log file from its own thread.
+
+    Readers queue the text without waiting for the disk. When the queue is
+    full, text is dropped and a line telling how much is written instead.
+    Errors such as a full disk are reported once, the text is then lost.
+    The file is rotated once it reaches rotate_size bytes or rotate_interval
+    seconds, see check_log_options and LogRotator.
+    """
+
+    def __init__(self, path, **options):
+        options = check_log_options(**options)
+        self.path = path
+        self.flush_policy = options['flush']
+        self.interval = options['interval']
+        self.fsync = options['fsync']
+        self.rotate_size = options['rotate_size']
+        self.rotate_interval = options['rotate_interval']
+        self.rotator = None
+        if self.rotate_size or self.rotate_interval:
+            self.rotator = LogRotator(path, options['compress'], options['keep'])
+        # Open file and when it was opened
+        self.log = None
+        self.opened = 0
+        # Text, threading.Event to set once flushed, or None to stop
+        self.queue = queue.Queue(LOG_QUEUE_LINES)
+        self.dropped = 0
+        self.reported = 0
+        self.error = None
+        self.thread = None
+
+    def start(self):
+        """ open the file and start writing """
+        self._open()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, text, block=False):
+        """ queue text, dropped if the queue is full unless block """
+        if self.dropped > self.reported:
+            try:
+                self.queue.put_nowait(f'>>>>>>>>>> {self.dropped - self.reported} lines dropped\n')
+                self.reported = self.dropped
+            except queue.Full:
+                pass
+        if not self._put(text, block):
+            self.dropped += 1
+
+    def flush(self, timeout=None):
+        """ wait until the text queued is written and flushed, or timeout
+        seconds, returns at once if the writer thread is not running """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        flushed = threading.Event()
+        if self._put(flushed, deadline=deadline):
+            self._wait(flushed.wait, deadline)
+
+    def close(self):
+        """ write the text queued and close the file """
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _put(self, item, block=True, deadline=None):
+        """ queue item, returns whether it was. When the queue is full, waits
+        for room if block while the writer thread runs, until deadline if not None """
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            if not block:
+                return False
+
+        def put(timeout):
+            try:
+                self.queue.put(item, timeout=timeout)
+                return True
+            except queue.Full:
+                return False
+        return self._wait(put, deadline)
+
+    def _wait(self, function, deadline):
+        """ call function(timeout) until it returns True while the writer
+        thread runs, until deadline if not None, returns whether it did """
+        while self.thread is not None and self.thread.is_alive():
+            timeout = LOG_WAIT_STEP
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    return False
+            if function(timeout):
+                return True
+        return False
+
+    def _report(self, error):
+        """ report the first error of the writer thread """
+        if self.error is None:
+            self.error = error
+            print(f'Warning: {error} happened when writing {self.path}, the log is incomplete')
+
+    def _open(self):
+        """ open the file, closed by the writer thread """
+        self.log = open(self.path, 'a', encoding='utf-8', errors='ignore')  # pylint: disable=consider-using-with
+        self.opened = time.monotonic()
+
+    def _rotate_if_due(self):
+        """ rotate the file if it is large or old enough """
+        if self.rotator is None:
+            return
+        if self.log.closed:
+            # Opening it failed after the last rotation
+            self._open()
+            return
+        if self.log.tell() == 0:
+            return
+        if (self.rotate_size and self.log.tell() >= self.rotate_size) or (
+                self.rotate_interval and time.monotonic() - self.opened >= self.rotate_interval):
+            self.log.close()
+            self.rotator.rotate()
+            self._open()
+
+    def _run(self):
+        """ write batches of queued text until None is queued """
+        last_flush = time.monotonic()
+        pending = False
+        try:
+            while True:
+                timeout = None
+                if pending and self.flush_policy == 'interval':
+                    timeout = max(0, last_flush + self.interval - time.monotonic())
+                try:
+                    batch, flushed, stop = self._get_batch(timeout)
+                except queue.Empty:
+                    batch, flushed, stop = [], [], False
+                if batch:
+                    self._write_batch(batch)
+                    pending = True
+                now = time.monotonic()
+                if pending and (flushed or stop or self._flush_due(now - last_flush)):
+                    # Not retried before the next batch if it failed
+                    self._flush_file()
+                    pending = False
+                    last_flush = now
+                for event in flushed:
+                    event.set()
+                if stop:
+                    return
+        finally:
+            try:
+                self.log.close()
+            except OSError as e:
+                self._report(e)
+            if self.rotator:
+                self.rotator.close()
+
+    def _write_batch(self, batch):
+        """ write a batch of text, rotating the file first if due """
+        try:
+            self._rotate_if_due()
+            self.log.write(''.join(batch).replace('\r\n', '\n').replace('\r', ''))
+        except OSError as e:
+            self._report(e)
+
+    def _flush_file(self):
+        """ flush the file, and fsync it if enabled """
+        try:
+            self.log.flush()
+            if self.fsync:
+                os.fsync(self.log.fileno())
+        except OSError as e:
+            self._report(e)
+
+    def _flush_due(self, elapsed):
+        """ returns whether the policy flushes elapsed seconds after the last flush """
+        if self.flush_policy == 'interval':
+            return elapsed >= self.interval
+        return self.flush_policy == 'line'
+
+    def _get_batch(self, timeout):
+        """ returns (texts, events, whether to stop) queued, up to LOG_BATCH_SIZE
+        characters, waiting up to timeout for the first one """
+        batch, flushed, size = [], [], 0
+        item = self.queue.get(timeout=timeout)
+        while True:
+            if item is None:
+                return batch, flushed, True
+            if isinstance(item, threading.Event):
+                flushed.append(item)
+            else:
+                batch.append(item)
+                size += len(item)
+                if size >= LOG_BATCH_SIZE:
+                    return batch, flushed, False
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return batch, flushed, False
@@ -0,0 +1,185 @@
+# Copyright 2023 Sony Corporation
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+TeraTerm Mode - waitln matcher
+"""
+
+import collections
+import re
+
+# index of the pattern in the patterns given to Matcher, pattern text,
+# line received so far and regex capture groups
+Match = collections.namedtuple('Match', ['index', 'pattern', 'line', 'groups'])
+
+# Regexes using group numbers or names cannot be combined with others
+_GROUP_REFERENCE = re.compile(r'\\[1-9]|\(\?P[=<]|\(\?<[^=!]')
+# Nor regexes with inline global flags such as (?i), only allowed at the start
+_GLOBAL_FLAGS = re.compile(r'\(\?[aiLmsux]+\)')
+
+
+class AhoCorasick:  # pylint: disable=too-few-public-methods
+    """ finds the first of several strings in a stream of text """
+
+    def __init__(self, words):
+        self.goto = [{}]
+        self.fail = [0]
+        # Lowest index of the words ending at each state
+        self.out = [None]
+        for index, word in enumerate(words):
+            state = 0
+            for char in word:
+                if char not in self.goto[state]:
+                    self.goto[state][char] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(None)
+                state = self.goto[state][char]
+            if self.out[state] is None:
+                self.out[state] = index
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                fail = self.goto[fail].get(char, 0)
+                self.fail[child] = fail
+                if self.out[fail] is not None and (
+                        self.out[child] is None or self.out[fail] < self.out[child]):
+                    self.out[child] = self.out[fail]
+
+    def search(self, text, state=0):
+        """ returns (state, (end, index)) of the first word found in text,
+        (state, None) if none, state is given back to search the next text """
+        if self.out[0] is not None:
+            return state, (0, self.out[0])
+        goto, fail, out = self.goto, self.fail, self.out
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state] is not None:
+                return state, (position + 1, out[state])
+        return state, None
+
+
+class Matcher:  # pylint: disable=too-few-public-methods
+    """ waits for the first of several strings or compiled regexes in a stream.
+
+    Text is fed as it is received, lines may come in several parts. Strings are
+    found with one Aho-Corasick automaton, regexes with one alternation when
+    possible, and are searched in the line received so far.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.literals = [i for i, p in enumerate(self.patterns) if isinstance(p, str)]
+        self.regexes = [i for i, p in enumerate(self.patterns) if not isinstance(p, str)]
+        self.automaton = None
+        if len(self.literals) > 1:
+            self.automaton = AhoCorasick([self.patterns[i] for i in self.literals])
+        self.state = 0
+        self.alternation = self._combine()
+        self.line = ''
+
+    def _combine(self):
+        """ returns (regex, [(pattern index, group, group count)]) of the regexes
+        as one alternation, None if they cannot be combined """
+        regexes = [self.patterns[i] for i in self.regexes]
+        if len(regexes) < 2 or len({regex.flags for regex in regexes}) > 1 or any(
+                _GROUP_REFERENCE.search(regex.pattern) or _GLOBAL_FLAGS.search(regex.pattern)
+                for regex in regexes):
+            return None
+        groups = []
+        group = 1
+        for index, regex in zip(self.regexes, regexes):
+            groups.append((index, group, regex.groups))
+            group += regex.groups + 1
+        alternation = '|'.join(f'({regex.pattern})' for regex in regexes)
+        try:
+            return re.compile(alternation, regexes[0].flags), groups
+        except re.error:
+            # Searched one by one instead
+            return None
+
+    def feed(self, text):
+        """ returns the Match of the first pattern found in text, None if none """
+        for part in text.splitlines(keepends=True):
+            start = len(self.line)
+            self.line += part
+            match = self._search(part, start)
+            if part.endswith(('\n', '\r')):
+                self.line = ''
+            if match:
+                return match
+        return None
+
+    def _search(self, part, start):
+        """ returns the Match ending first in the current line, whose part
+        starting at start was just received """
+        found = []
+        if self.automaton:
+            self.state, literal = self.automaton.search(part, self.state)
+            if literal:
+                end, number = literal
+                found.append((start + end, self.literals[number], ()))
+        elif self.literals:
+            pattern = self.patterns[self.literals[0]]
+            # The string may start in the previous parts of the line
+            position = self.line.find(pattern, max(0, start - len(pattern) + 1))
+            if position >= 0:
+                found.append((position + len(pattern), self.literals[0], ()))
+        found.extend(self._search_regexes())
+        if not found:
+            return None
+        _, index, groups = min(found)
+        pattern = self.patterns[index]
+        return Match(
+            index, pattern if isinstance(pattern, str) else pattern.pattern,
+            self.line.rstrip('\r\n'), groups
+        )
+
+    def _search_regexes(self):
+        """ yields (end, pattern index, groups) of the regexes found in the line """
+        if self.alternation:
+            regex, groups = self.alternation
+            match = regex.search(self.line)
+            if match:
+                for index, group, count in groups:
+                    if match.group(group) is not None:
+                        yield match.end(), index, match.groups()[group:group + count]
+                        return
+            return
+        for index in self.regexes:
+            match = self.patterns[index].search(self.line)
+            if match:
+                yield match.end(), index, match.groups()
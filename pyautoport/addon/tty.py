@@ -31,96 +31,107 @@
 TeraTerm Mode - TTY Connect
 """
 
+import codecs
 import os
 import time
 import threading
 import serial
 import serial.tools.list_ports
 from pyautoport.addon.addon import AddonStrategy
+from pyautoport.addon.logwriter import LogWriter, check_log_options, write_log_header
 
 # pylint: disable=duplicate-code
-class TTYStrategy(AddonStrategy):
-    """ Connection via uart """
-    save_log = False
-    log_file = 'tty.log'
+class TTYStrategy(AddonStrategy):  # pylint: disable=too-many-instance-attributes
+    """ Connection via uart, logged to <name>.log by default """
 
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(TTYStrategy, cls).__new__(cls)
-        return cls._instance
-
-    def __init__(self):
-        if self._first_init:
-            self.timeout = 0.5
-            self.thread = None
-            self.port = None
-            self.running = False
-            TTYStrategy._first_init = False
-            self.read = {"exist": False, "find": '', "found": ''}
+    def __init__(self, name='tty'):
+        super().__init__(name)
+        self.timeout = 0.5
+        self.port = None
 
     def _start_thread(self):
         self.running = True
+        self.ready.clear()
         self.thread = threading.Thread(target=self._read)
         self.thread.start()
+        self.ready.wait(timeout=1)
 
     def _stop_thread(self):
         self.running = False
+        self.ready.clear()
+        if self.port and self.port.is_open:
+            # Return from readline without waiting for its timeout
+            self.port.cancel_read()
+        self.wake_waiters()
         if self.thread:
             self.thread.join(timeout=1)
 
     def _read(self):
         has_message = False
-        with open(self.log_file, 'a', encoding='utf-8', errors='ignore') as f:
+        # Characters may be split by the timeout of readline
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        with LogWriter(self.log_file, **self.log_options) as f:
+            # The disk is written by the thread of f, not this one
+            self.log_writer = f
+            self.ready.set()
             while self.running:
                 output = ''
                 if self.port and self.port.is_open:
-                    output = self.port.readline().decode(encoding='utf-8', errors='ignore')
+                    output = decoder.decode(self.port.readline())
                 if not self.running:
                     break
                 if output:
+                    # Lines may come in several parts, on timeout of readline
+                    self.match_line(output)
                     #output = output.strip()
                     if self.timestamp and has_message:
                         time_stamp = time.time()
                         output = '[' + str(time_stamp) + '] ' + output
                     if has_message:
                         print(output.strip())
-                    f.write(output.replace('\r\n', '\n').replace('\r', ''))
-                    f.flush()
+                    f.write(output)
                     has_message = True
-                    if self.read["find"] != '' and self.read["find"] in output:
-                        self.read["exist"] = True
-                        self.read["found"] = output.replace('\r\n', '\n').replace('\r', '')
-                        self.read['find'] = ''
                 else:
                     has_message = False
                     time.sleep(0.1)
             self.running = False
+            self.wake_waiters()
+            self.log_writer = None
 
     def set_timeout(self, timeout):
         """ set timeout in uart session """
         self.timeout = timeout
 
-    def set_log(self, log_file='tty.log', save_flag=True):
+    def set_log(self, log_file=None, save_flag=True, **log_options):
         """ set logstart in uart session """
+        log_options = check_log_options(**log_options)
+        if self.port:
+            # Reopen the same port
+            port, baudrate = self.port.port, self.port.baudrate
+        else:
+            port = os.environ.get('TESTER_UART_PORT', '/dev/ttyACM0')
+            baudrate = os.environ.get('TESTER_UART_BAUDRATE', '125000')
         if self.port and self.port.is_open:
+            # Stop the reader before closing the port it reads
+            self.disconnect()
             self.port.close()
             self.port = None
-            self.disconnect()
-        port = os.environ.get('TESTER_UART_PORT', '/dev/ttyACM0')
-        baudrate = os.environ.get('TESTER_UART_BAUDRATE', '125000')
-        self.log_file = log_file
+        self.log_file = log_file or f'{self.name}.log'
         self.save_log = save_flag
+        self.log_options = log_options
+        write_log_header(
+            self.log_file, f'>>>>>>>>>> tty log start, port={port}, baudrate={baudrate}\n',
+            log_options
+        )
         self.connect(port=port, baudrate=baudrate)
-        with open(self.log_file, 'w', encoding='utf-8', errors='ignore') as f:
-            f.write(f'>>>>>>>>>> tty log start, port={port}, baudrate={baudrate}\n')
 
     def connect(self, port='/dev/ttyACM0', baudrate=125000):
         """ connect via uart """
         if self.port and self.port.is_open:
+            # Stop the reader before closing the port it reads
+            self.disconnect()
             self.port.close()
             self.port = None
-            self.disconnect()
-        self._start_thread()
         try:
             self.port = serial.Serial(port=port, baudrate=baudrate, timeout=self.timeout)
         except serial.SerialException:
@@ -130,13 +141,15 @@ class TTYStrategy(AddonStrategy):
             print('COM list:')
             for info in list(serial.tools.list_ports.comports()):
                 print(f'{info.device}: {info.description}')
+            return
+        self._start_thread()
 
     def send_data(self, data):
         """ send commands via uart session """
         if self.port and self.port.is_open:
+            self.mark_sent()
             self.port.write(data.encode('utf-8'))
             self.port.write('\n'.encode('utf-8'))
-            time.sleep(0.05)
         else:
             print('connect_uart failed,'
                 'Please make sure execute connect uart before')
@@ -147,30 +160,11 @@ class TTYStrategy(AddonStrategy):
             print('Cannot send data to log file,'
                 'Please execute logstart before')
         else:
-            with open(self.log_file, 'ab') as f:
-                f.write(data.encode('utf-8'))
-                f.write('\n'.encode('utf-8'))
-
-    def read_data(self, data):
-        """ read data via uart session """
-        start_time = time.time()
-        self.read = {"exist": False, "find": data, "found": ''}
-        while self.running:
-            if self.read["exist"]:
-                print(f'>>>>>>>>>> Found message: {self.read["found"]}')
-                return True
-            current_time = time.time() - start_time
-            if current_time >= self.timeout:
-                print('>>>>>>>>>> Not Found message, Timeout occureed!!!')
-                return False
-        print('>>>>>>>>>> Read log Thread not exist, Please check it.')
-        return False
+            self.write_log(f'{data}\n')
 
     def disconnect(self):
         """ disconnect from uart """
         if self.running:
-            time.sleep(0.3)
             self._stop_thread()
         if not self.save_log and os.path.exists(self.log_file):
-            time.sleep(0.3)
             os.remove(self.log_file)
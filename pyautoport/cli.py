@@ -0,0 +1,90 @@
+# Copyright 2023 Sony Corporation
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""
+Multicall entry point
+
+Runs any command of pyautoport while importing only the module it needs:
+
+    pyautoport send ls /
+
+The command may also be given by the name the launcher is called with, as in
+ln -s "$(which pyautoport)" send.
+"""
+
+import importlib
+import os
+import sys
+
+# Command: (module, function)
+COMMANDS = {
+    'uart_send': ('uart', 'uart_send'),
+    'adb_send': ('adb', 'adb_send_via_bash'),
+    'adb_tail': ('adb', 'adb_tail_via_bash'),
+    'adb_open': ('adb', 'adb_open'),
+    'adb_reopen': ('adb', 'adb_reopen'),
+    'adb_close': ('adb', 'adb_close_via_bash'),
+    'session_start': ('teraterm', 'open_session_start'),
+    'getenv': ('teraterm', 'get_env_via_bash'),
+    'setenv': ('teraterm', 'set_env_via_bash'),
+    'connect': ('teraterm', 'connect_via_bash'),
+    'send': ('teraterm', 'send_via_bash'),
+    'mpause': ('teraterm', 'set_pause_via_bash'),
+    'logstart': ('teraterm', 'start_log_via_bash'),
+    'logwrite': ('teraterm', 'send_log_via_bash'),
+    'logstop': ('teraterm', 'stop_log_via_bash'),
+    'set_timestamp': ('teraterm', 'set_timestamp_via_bash'),
+    'set_timeout': ('teraterm', 'set_timeout_via_bash'),
+    'waitln': ('teraterm', 'wait_log_via_bash'),
+    'disconnect': ('teraterm', 'disconnect_via_bash'),
+    'session_stop': ('teraterm', 'session_stop'),
+    'ttlrun': ('ttl', 'run_ttl_via_bash'),
+}
+
+
+def get_command(name):
+    """Returns the function running a command"""
+    module, function = COMMANDS[name]
+    return getattr(importlib.import_module(f'pyautoport.{module}'), function)
+
+
+def main(argv=None):
+    """Bash entry for all commands"""
+    argv = sys.argv if argv is None else argv
+    # Called through a link named after the command, .exe launchers on Windows
+    name = os.path.splitext(os.path.basename(argv[0]))[0]
+    args = argv[1:]
+    if name not in COMMANDS:
+        if not args or args[0] not in COMMANDS:
+            print('usage: pyautoport command [args ...]', file=sys.stderr)
+            print(f'commands: {", ".join(COMMANDS)}', file=sys.stderr)
+            return 2
+        name, args = args[0], args[1:]
+    # Commands parse sys.argv, with the command name in usage messages
+    sys.argv = [name] + args
+    return get_command(name)()
@@ -0,0 +1,131 @@
+# Copyright 2023 Sony Corporation
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""
+Framed protocol between the daemons and their clients
+"""
+
+import json
+import struct
+
+# Every frame starts with: magic, version, kind, request id, payload length
+HEADER = struct.Struct('!2sBBII')
+MAGIC = b'PA'
+VERSION = 1
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+# Frame kinds
+REQUEST = 1  # JSON fields of a request
+DATA = 2     # Raw output of a request
+END = 3      # JSON fields closing the response of a request
+START = 4    # Empty, the request runs, after waiting for the requests before it
+
+
+class ProtocolError(Exception):
+    """Raised when a peer sends something that is not a valid frame"""
+
+
+def encode_frame(kind, request_id, payload=b''):
+    """Returns a frame carrying payload bytes"""
+    return HEADER.pack(MAGIC, VERSION, kind, request_id, len(payload)) + payload
+
+
+def encode_fields(kind, request_id, **fields):
+    """Returns a frame carrying fields as JSON"""
+    return encode_frame(kind, request_id, json.dumps(fields).encode())
+
+
+def decode_fields(payload):
+    """Returns the fields of a REQUEST or END frame"""
+    try:
+        fields = json.loads(payload.decode())
+    except ValueError as e:
+        raise ProtocolError(f'Invalid fields: {e}') from e
+    if not isinstance(fields, dict):
+        raise ProtocolError('Invalid fields: not an object')
+    return fields
+
+
+def decode_header(header):
+    """Returns (kind, request_id, payload length) of a frame header"""
+    magic, version, kind, request_id, length = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ProtocolError('Invalid frame: bad magic')
+    if version != VERSION:
+        raise ProtocolError(f'Unsupported protocol version {version}')
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f'Frame too large: {length} bytes')
+    return kind, request_id, length
+
+
+def _recv_exactly(sock, size):
+    """Receive exactly size bytes, or None if the peer closed first"""
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            if data:
+                raise ProtocolError('Connection closed in the middle of a frame')
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(sock):
+    """Receive one frame from a blocking socket.
+
+    Returns (kind, request_id, payload), or None if the peer closed the connection.
+    """
+    header = _recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    kind, request_id, length = decode_header(header)
+    payload = _recv_exactly(sock, length) if length else b''
+    if payload is None:
+        raise ProtocolError('Connection closed in the middle of a frame')
+    return kind, request_id, payload
+
+
+async def read_frame(reader):
+    """Read one frame from an asyncio stream.
+
+    Returns (kind, request_id, payload), or None if the peer closed the connection.
+    """
+    # EOFError catches asyncio.IncompleteReadError, asyncio is not imported to keep clients light
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except EOFError as e:
+        if getattr(e, 'partial', b''):
+            raise ProtocolError('Connection closed in the middle of a frame') from e
+        return None
+    kind, request_id, length = decode_header(header)
+    try:
+        payload = await reader.readexactly(length)
+    except EOFError as e:
+        raise ProtocolError('Connection closed in the middle of a frame') from e
+    return kind, request_id, payload
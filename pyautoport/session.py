@@ -36,75 +36,117 @@ from pyautoport.addon.adb import ADBStrategy
 from pyautoport.addon.tty import TTYStrategy
 
 class ConnectSession():
-    """ Base Class """
+    """ Named connections, all running at the same time.
+
+    Commands go to the connection named by their to argument, or to the current
+    one, which is the last connected.
+    """
     _instance = None
+    strategies = {'tty': TTYStrategy, 'adb': ADBStrategy}
+    # Name: strategy of the connections, and the name of the current one, set
+    # by __new__ on the only instance
+    connections = {}
+    current = None
 
     def __new__(cls):
         if cls._instance is None:
+            # Once, ConnectSession() must not drop the connections of the session
             cls._instance = super(ConnectSession, cls).__new__(cls)
+            cls._instance.connections = {}
+            cls._instance.current = None
         return cls._instance
 
-    def __init__(self):
-        self._type = None
-        self.strategy = None
-
     @property
     def type(self):
-        """ get session type """
-        return self._type
-
-    @type.setter
-    def type(self, type_choose):
-        """ set session type """
-        self._type = type_choose
-        if type_choose == 'tty':
-            self.strategy = TTYStrategy()
-        elif type_choose == 'adb':
-            self.strategy = ADBStrategy()
-        else:
-            raise ValueError('Invalid connection type')
+        """ get type of the current connection """
+        if self.current is None:
+            return None
+        return self.get_type(self.current)
+
+    def get_type(self, name):
+        """ get connection type of a connection """
+        strategy = self.get(name)
+        return next(
+            type_choose for type_choose, cls in self.strategies.items()
+            if isinstance(strategy, cls)
+        )
+
+    def get(self, name=None):
+        """ get the connection called name, or the current one """
+        name = self.current if name is None else name
+        if name not in self.connections:
+            raise ValueError(f'No connection named {name}' if name else 'No connection')
+        return self.connections[name]
 
     def get_env(self, key):
         """ get environment """
-        envname = os.environ.get(key)
-        print(f'{key} = {envname}')
+        return os.environ.get(key)
 
     def set_env(self, key, value):
         """ set environment """
         os.environ[key] = value
 
-    def connect(self, *args, **kwargs):
-        """ invoke connect """
-        self.strategy.connect(*args, **kwargs)
-
-    def connect_check(self):
+    def connect(self, type_choose, name=None, **kwargs):
+        """ connect, or switch to the connection called name, by default type_choose """
+        if type_choose not in self.strategies:
+            raise ValueError(f'Invalid connection type: {type_choose}')
+        name = name or type_choose
+        if name in self.connections:
+            if self.get_type(name) != type_choose:
+                raise ValueError(f'Connection {name} is not {type_choose}')
+        else:
+            self.check_port_unused(kwargs.get('port'))
+            self.connections[name] = self.strategies[type_choose](name)
+        self.current = name
+        if not self.connections[name].running:
+            self.connections[name].connect(**kwargs)
+
+    def check_port_unused(self, port):
+        """ raise ValueError if another uart connection reads port """
+        for other, strategy in self.connections.items():
+            if isinstance(strategy, TTYStrategy) and strategy.port and strategy.port.port == port:
+                raise ValueError(f'{port} is already used by connection {other}')
+
+    def connect_check(self, name=None):
         """ get connect status """
-        return self.strategy.running
+        name = self.current if name is None else name
+        return name in self.connections and self.connections[name].running
 
-    def set_timeout(self, timeout):
+    def set_timeout(self, timeout, name=None):
         """ set timeout """
-        self.strategy.set_timeout(timeout)
+        self.get(name).set_timeout(timeout)
 
-    def set_log(self, *args, **kwargs):
+    def set_log(self, name=None, **kwargs):
         """ log start/stop """
-        self.strategy.set_log(*args, **kwargs)
+        self.get(name).set_log(**kwargs)
 
-    def set_timestamp(self):
+    def set_timestamp(self, name=None):
         """ set timestamp """
-        self.strategy.timestamp = True
+        self.get(name).timestamp = True
 
-    def send_data(self, data):
+    def send_data(self, data, name=None):
         """ send data via connection """
-        self.strategy.send_data(data)
+        self.get(name).send_data(data)
 
-    def send_data_to_log(self, data):
+    def send_data_to_log(self, data, name=None):
         """ send data to log """
-        self.strategy.send_data_to_log(data)
-
-    def read_data(self, data):
-        """ read data """
-        self.strategy.read_data(data)
-
-    def disconnect(self):
-        """ invoke disconnect """
-        self.strategy.disconnect()
+        self.get(name).send_data_to_log(data)
+
+    def read_data(self, data, name=None, since='send'):
+        """ read data, returns the Match found or None """
+        return self.get(name).read_data(data, since)
+
+    def disconnect(self, name):
+        """ disconnect a connection, all of a type, or 'all' """
+        if name == 'all':
+            names = list(self.connections)
+        elif name in self.strategies:
+            names = [other for other in self.connections if self.get_type(other) == name]
+        elif name in self.connections:
+            names = [name]
+        else:
+            raise ValueError(f'No connection named {name}')
+        for other in names:
+            self.connections.pop(other).disconnect()
+        if self.current not in self.connections:
+            self.current = next(reversed(self.connections), None)
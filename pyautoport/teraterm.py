@@ -29,192 +29,373 @@
 
 """
 TeraTerm Mode
+
+Commands are sent to the session daemon as framed requests, see protocol.py,
+with the command name and its argument. The daemon runs the commands of each
+connection one at a time and answers each one with an END frame holding its
+status ('ok' or 'error'), its value, such as which text waitln found, and an
+error message.
 """
 
 import os
+import re
+import sys
 import time
 import threading
-import socket
 import select
+import socket
 import argparse
 from queue import Queue
-from pyautoport.session import ConnectSession
+from pyautoport import protocol, transport
 
 PORT_WRITE = 18890
-PID_FILE = 'tester-daemon.pid'
+PID_FILE = os.path.join(transport.runtime_dir(), 'tester-daemon.pid')
 event_stop_session = threading.Event()
+event_session_listening = threading.Event()
 
 def session_start():
     """ Open a session thread """
+    # Only the daemon needs the connections and pyserial, not the commands
+    from pyautoport.session import ConnectSession  # pylint: disable=import-outside-toplevel
     session = ConnectSession()
     queue_recv = Queue()
     event_stop_session.clear()
+
+    # Set daemon socket, fails if another session is running
+    server_socket = transport.create_server_socket('teraterm', PORT_WRITE)
+    print(f'Server listening on {transport.describe(server_socket)}')
+    transport.make_private_dir(os.path.dirname(PID_FILE))
     with open(PID_FILE, 'w', encoding='utf-8') as f:
         f.write(f'{os.getpid()}\n')
 
-    # Set daemon socket
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server_socket.bind(('localhost', PORT_WRITE))
-    server_socket.listen(5)
-    print(f'Server listening on port {PORT_WRITE}')
-
     recv_thread = threading.Thread(target=recv_handle, args=(session, queue_recv,))
     recv_thread.start()
 
-    while session is not None:
-        client_socket, _ = server_socket.accept()
-        ready = select.select([client_socket], [], [], 0)
-        while ready[0]:
-            data = client_socket.recv(1024).decode().strip()
-            if len(data) > 2 and data[0:2] == 'it':
-                queue_recv.put(data)
-            if len(data) > 6 and data[0:6] == 'itstop':
-                while not event_stop_session.is_set():
-                    time.sleep(0.1)
-                client_socket.send('Stop listening\n'.encode())
+    # Clients wake up the accept loop through waker once the session stopped
+    waiter, waker = socket.socketpair()
+    with waiter, waker:
+        event_session_listening.set()
+        while True:
+            ready, _, _ = select.select([server_socket, waiter], [], [])
+            if waiter in ready:
+                break
+            client_socket, _ = server_socket.accept()
+            if not transport.peer_is_same_user(client_socket):
+                print('Warning: refused a client of another user')
                 client_socket.close()
-                return
-            ready = select.select([client_socket], [], [], 0)
+                continue
+            client_thread = threading.Thread(
+                target=client_handle, args=(client_socket, queue_recv, waker,)
+            )
+            client_thread.daemon = True
+            client_thread.start()
+        event_session_listening.clear()
+    recv_thread.join()
+    transport.close_server_socket(server_socket)
+
+def client_handle(client_socket, queue_recv, waker):
+    """ Serve the requests of one client until it disconnects """
+    with client_socket:
+        while True:
+            try:
+                frame = protocol.recv_frame(client_socket)
+            except (protocol.ProtocolError, OSError) as e:
+                print(f'Warning: {e} happened when reading request')
+                break
+            if frame is None:
+                break
+            kind, request_id, payload = frame
+            if kind != protocol.REQUEST:
+                continue
+            fields = protocol.decode_fields(payload)
+            # Wait for recv_handle to run the command
+            queue_response = Queue(maxsize=1)
+            queue_recv.put((fields, queue_response))
+            response = queue_response.get()
+            try:
+                client_socket.sendall(protocol.encode_fields(protocol.END, request_id, **response))
+            except OSError:
+                break
+            if fields.get('command') == 'stop':
+                waker.send(b'\0')
+                break
 
 def recv_handle(session, queue_recv):
-    """ receive commands handle """
-    connect_actions = {
-            "get_env": get_env,
-            "set_env": set_env,
-            "connect": open_conn,
-            "disconnect": close_conn,
-            }
-    handle_actions = {
-            "send": send,
-            "set_timeout": set_timeout,
-            "send_log": send_log,
-            "wait_log": wait_log,
-            }
-    while session is not None:
-        if queue_recv.qsize() > 0:
-            data = queue_recv.get()
-            data_index = data.find('@')
-            data_function = data[2:data_index]
-            if data_function in connect_actions:
-                connect_actions[data_function](session, data[data_index+1:])
-            if data_function in handle_actions and check_connection(session):
-                handle_actions[data_function](session, data[data_index+1:])
-            if data_function == 'stop':
-                close_conn(session, 'all')
-                print('Server listening stop')
-                event_stop_session.set()
-                break
-            if data_function == 'logstart' and check_connection(session):
-                set_log(session, data[data_index+1:], True)
-            if data_function == 'logstop' and check_connection(session):
-                set_log(session, None, False)
-            if data_function == 'set_timestamp' and check_connection(session):
-                set_timestamp(session)
-            if data_function == 'pause':
-                time.sleep(float(data[data_index+1:]))
-            time.sleep(0.3)
-
-def check_connection(session):
+    """ receive commands handle, blocking until the next command arrives.
+
+    connect and disconnect run here, the other commands in order in the worker
+    of their connection, so that waitln or pause on one connection does not
+    hold the commands of the others.
+    """
+    workers = {}
+    while True:
+        fields, queue_response = queue_recv.get()
+        command, arg, to = fields.get('command'), fields.get('arg', ''), fields.get('to') or None
+        if command == 'stop':
+            for queue_worker, worker in workers.values():
+                queue_worker.put(None)
+                worker.join()
+            try:
+                close_conn(session, 'all', None)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                print(f'Warning: {e!r} happened when closing the connections')
+            print('Server listening stop')
+            event_stop_session.set()
+            queue_response.put({'status': 'ok'})
+            break
+        if command in ('connect', 'disconnect') or not isinstance(to or '', str):
+            queue_response.put(run_command(session, command, arg, to))
+            continue
+        # The connection is chosen now, a later connect does not move the command
+        name = to or session.current
+        if name not in workers:
+            queue_worker = Queue()
+            worker = threading.Thread(target=worker_handle, args=(session, queue_worker,))
+            worker.daemon = True
+            worker.start()
+            workers[name] = (queue_worker, worker)
+        workers[name][0].put((command, arg, name, queue_response))
+
+def worker_handle(session, queue_worker):
+    """ run the commands of one connection in order, until None arrives """
+    while True:
+        item = queue_worker.get()
+        if item is None:
+            break
+        command, arg, to, queue_response = item
+        queue_response.put(run_command(session, command, arg, to))
+
+def run_command(session, command, arg='', to=None):
+    """ Run one command on the connection called to, or the current one.
+
+    Returns the response fields, an error response whatever the handler raised.
+    """
+    if not isinstance(command, str) or command not in HANDLE_ACTIONS:
+        return {'status': 'error', 'message': f'Unknown command: {command}'}
+    handler, need_connection = HANDLE_ACTIONS[command]
+    to = to or None
+    if to is not None and not isinstance(to, str):
+        return {'status': 'error', 'message': f'Invalid connection name: {to}'}
+    try:
+        if need_connection and not check_connection(session, to):
+            message = 'Did you run connect adb or connect uart'
+            if to is not None:
+                message = f'No connection named {to}'
+            return {'status': 'error', 'message': message}
+        value = handler(session, arg, to)
+    except (ValueError, OSError) as e:
+        print(f'Warning: {e} happened when running {command}')
+        return {'status': 'error', 'message': str(e)}
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        # Such as a malformed argument, the dispatcher must keep running
+        print(f'Warning: {e!r} happened when running {command}')
+        return {'status': 'error', 'message': f'{type(e).__name__}: {e}'}
+    return {'status': 'ok', 'value': value}
+
+def check_connection(session, to=None):
     """ Check session connect status """
-    if session.type is None or session.connect_check() is False:
-        print('Did you run connect_adb or connect_uart')
-        return False
-    return True
+    return session.connect_check(to)
 
 def open_session_start():
     """ Python or Bash entry for start session"""
     if not os.path.exists(PID_FILE):
         start_thread = threading.Thread(target=session_start)
         start_thread.start()
+        event_session_listening.wait(timeout=5)
 
-def get_env(session, key):
+def get_env(session, key, _to):
     """ get env """
-    session.get_env(key)
+    return session.get_env(key)
 
-def set_env(session, param):
+def set_env(session, param, _to):
     """ set env """
     key, value = param.split()
     session.set_env(str(key), str(value))
 
-def open_conn(session, port):
-    """ session connect """
-    first_connect = True
-    if port in ('adb', 'tty'):
-        session.type = port
-        if session.connect_check():
-            first_connect = False
-    if port == 'tty' and first_connect:
-        port = os.environ.get('TESTER_UART_PORT', '/dev/ttyACM0')
-        baudrate = os.environ.get('TESTER_UART_BAUDRATE', '125000')
-        session.connect(port=port, baudrate=baudrate)
-    if port == 'adb' and first_connect:
-        serial_port = os.environ.get('TESTER_ADB_PORT', '')
-        session.connect(serial_port=serial_port)
-    time.sleep(0.3)
-
-def close_conn(session, port):
-    """ session disconnect """
-    if port in ('all', 'tty'):
-        session.type = 'tty'
-        session.disconnect()
-        session.type = 'adb'
-    if port in ('all', 'adb'):
-        session.type = 'adb'
-        session.disconnect()
-        session.type = 'tty'
-    if port == 'all':
-        session = None
-    time.sleep(0.3)
-
-def send(session, text):
+def open_conn(session, param, to):
+    """ session connect, the connection is called to or by its type.
+
+    param is tty [device [baudrate]] or adb [serial], by default from the environment.
+    """
+    port, *options = param.split()
+    if port == 'tty':
+        options += [
+            os.environ.get('TESTER_UART_PORT', '/dev/ttyACM0'),
+            os.environ.get('TESTER_UART_BAUDRATE', '125000'),
+        ][len(options):]
+        session.connect(port, to, port=options[0], baudrate=int(options[1]))
+    elif port == 'adb':
+        options.append(os.environ.get('TESTER_ADB_PORT', ''))
+        session.connect(port, to, serial_port=options[0])
+    else:
+        raise ValueError(f'Invalid connection type: {port}')
+    if not session.connect_check():
+        raise ConnectionError(f'connect {session.current} failed')
+
+def close_conn(session, port, _to):
+    """ session disconnect a connection, all of a type or all """
+    session.disconnect(port)
+
+def send(session, text, to):
     """ send text in session """
-    session.send_data(text)
+    session.send_data(text, to)
 
-def set_log(session, file_name, save_flag):
+def set_log(session, file_name, save_flag, to=None, **log_options):
     """ set start/stop log in session """
-    if file_name is not None:
-        session.set_log(log_file=file_name, save_flag=save_flag)
+    if file_name:
+        session.set_log(to, log_file=file_name, save_flag=save_flag, **log_options)
+    else:
+        session.set_log(to, save_flag=save_flag, **log_options)
+
+def start_log(session, arg, to):
+    """ start log in session, arg is the file name or a dict with the file
+    name and the LogWriter options """
+    if isinstance(arg, dict):
+        options = dict(arg)
+        set_log(session, options.pop('file', None), True, to, **options)
     else:
-        session.set_log(save_flag=save_flag)
+        set_log(session, arg, True, to)
 
-    time.sleep(0.3)
+def stop_log(session, _, to):
+    """ stop log in session """
+    set_log(session, None, False, to)
 
-def set_timestamp(session):
+def set_timestamp(session, _, to):
     """ set timestamp in session """
-    session.set_timestamp()
+    session.set_timestamp(to)
 
-def set_timeout(session, timeout):
+def pause(_session, pause_time, _to):
+    """ sleep in session """
+    time.sleep(float(pause_time))
+
+def set_timeout(session, timeout, to):
     """ set timeout in session """
-    session.set_timeout(float(timeout))
+    session.set_timeout(float(timeout), to)
 
-def send_log(session, text):
+def send_log(session, text, to):
     """ send text into log in session """
-    session.send_data_to_log(text)
-
-def wait_log(session, text):
-    """ wait text in log in session """
-    session.read_data(text)
-
-def client_socket_send(cmd, need_close=False):
-    """ checkt client socket has been created before send command """
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    session.send_data_to_log(text, to)
+
+def wait_log(session, patterns, to):
+    """ wait for one of patterns in session, strings or {'regex': pattern},
+    or {'patterns': patterns, 'since': since} to choose where the search
+    starts, see AddonStrategy.history_since.
+
+    Returns the first match as a dict with the index of its pattern, the line
+    and the regex groups, None on timeout.
+    """
+    since = 'send'
+    if isinstance(patterns, dict) and 'patterns' in patterns:
+        since = patterns.get('since', since)
+        patterns = patterns['patterns']
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    try:
+        patterns = [
+            re.compile(pattern['regex']) if isinstance(pattern, dict) else pattern
+            for pattern in patterns
+        ]
+    except re.error as e:
+        raise ValueError(f'Invalid regex: {e}') from e
+    match = session.read_data(patterns, to, since)
+    return match._asdict() if match else None
+
+# Command name: (handler, whether the session must be connected)
+HANDLE_ACTIONS = {
+        "get_env": (get_env, False),
+        "set_env": (set_env, False),
+        "connect": (open_conn, False),
+        "disconnect": (close_conn, False),
+        "pause": (pause, False),
+        "send": (send, True),
+        "set_timeout": (set_timeout, True),
+        "send_log": (send_log, True),
+        "wait_log": (wait_log, True),
+        "logstart": (start_log, True),
+        "logstop": (stop_log, True),
+        "set_timestamp": (set_timestamp, True),
+        }
+
+class SessionClient:
+    """ Connection to the session daemon, for any number of commands """
+
+    def __init__(self):
+        """ Raises ConnectionRefusedError if the daemon is not running """
+        self.socket = transport.connect('teraterm', PORT_WRITE)
+        self.request_id = 0
+
+    def request(self, command, arg='', to=None):
+        """ Run a command on the connection called to, or the current one.
+
+        Returns the response fields once it is done.
+        """
+        self.request_id += 1
+        self.socket.sendall(protocol.encode_fields(
+            protocol.REQUEST, self.request_id, command=command, arg=arg, to=to
+        ))
+        while True:
+            frame = protocol.recv_frame(self.socket)
+            if frame is None:
+                raise ConnectionResetError('Session daemon closed the connection')
+            kind, request_id, payload = frame
+            if kind == protocol.END and request_id == self.request_id:
+                return protocol.decode_fields(payload)
+
+    def close(self):
+        """ Close the connection """
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class SessionError(Exception):
+    """ A command failed in the session daemon """
+
+def client_socket_send(command, arg='', to=None):
+    """ Run one command in the session daemon, returns its value.
+
+    Raises ConnectionRefusedError if the daemon is not running, SessionError
+    if the command failed.
+    """
+    with SessionClient() as client:
+        response = client.request(command, arg, to)
+    if response.get('status') != 'ok':
+        raise SessionError(response.get('message', f'{command} failed'))
+    return response.get('value')
+
+def bash_socket_send(command, arg='', to=None):
+    """ client_socket_send for the Bash entries, exits if it failed """
     try:
-        client_socket.connect(('localhost', PORT_WRITE))
-    except ConnectionRefusedError:
-        print('Did you run session_start &')
-        return
-    client_socket.send(cmd)
-    time.sleep(0.5)
-    if need_close:
-        client_socket.close()
+        return client_socket_send(command, arg, to)
+    except (ConnectionRefusedError, ConnectionResetError):
+        print('Did you run session_start &', file=sys.stderr)
+    except SessionError as e:
+        print(e, file=sys.stderr)
+    sys.exit(1)
+
+def add_to_argument(parser):
+    """ Add the option choosing the connection """
+    parser.add_argument(
+        '--to', metavar='NAME',
+        help='Name of the connection, by default the last connected'
+    )
+
+def get_connection_type(method):
+    """ Returns the connection type of uart or adb, other names unchanged """
+    return {'uart': 'tty'}.get(method, method)
 
 def get_env_via_bash():
     """ Python or Bash get env """
     parser = argparse.ArgumentParser()
     parser.add_argument('envname', help='Environment Name')
     args = parser.parse_args()
-    client_socket_send(f'itget_env@{args.envname}\n'.encode())
+    value = bash_socket_send('get_env', args.envname)
+    if value is None:
+        sys.exit(1)
+    print(value)
 
 def set_env_via_bash():
     """ Python or Bash set env """
@@ -223,69 +404,113 @@ def set_env_via_bash():
     parser.add_argument('strvar', help='Environment Value')
     args = parser.parse_args()
     var = ' '.join([args.envname, args.strvar])
-    client_socket_send(f'itset_env@{var}\n'.encode())
+    bash_socket_send('set_env', var)
 
 def connect_via_bash():
     """ Python or Bash entry for connect """
     parser = argparse.ArgumentParser()
-    parser.add_argument('connection', nargs='+', help='Connect to adb or uart via Terminal')
+    parser.add_argument('method', choices=['adb', 'uart'], help='Connect to adb or uart')
+    parser.add_argument(
+        'name', nargs='?',
+        help='Name of the connection, by default adb or tty; connects or switches to it'
+    )
+    parser.add_argument(
+        'device', nargs='?',
+        help='UART port or ADB serial number, by default TESTER_UART_PORT or TESTER_ADB_PORT'
+    )
+    parser.add_argument(
+        'baudrate', nargs='?', type=int,
+        help='UART baudrate, by default TESTER_UART_BAUDRATE'
+    )
     args = parser.parse_args()
-    connection = ' '.join(args.connection)
-    infos = connection.split()
-    method = infos[0]
 
+    options = [str(option) for option in (args.device, args.baudrate) if option is not None]
     open_session_start()
-    if method == 'adb':
-        client_socket_send('itconnect@adb\n'.encode())
-    if method == 'uart':
-        client_socket_send('itconnect@tty\n'.encode())
-    time.sleep(0.5)
+    bash_socket_send(
+        'connect', ' '.join([get_connection_type(args.method)] + options), args.name
+    )
 
 def disconnect_via_bash():
     """ Python or Bash entry for disconnect """
     parser = argparse.ArgumentParser()
-    parser.add_argument('connection', nargs='+', help='Disconnect to adb or uart via Terminal')
+    parser.add_argument(
+        'connection',
+        help='Name of the connection, or adb, uart or all to disconnect all of them'
+    )
     args = parser.parse_args()
-    connection = ' '.join(args.connection)
-    infos = connection.split()
-    method = infos[0]
 
     open_session_start()
-    if method == 'adb':
-        client_socket_send('itdisconnect@adb\n'.encode())
-    if method == 'uart':
-        client_socket_send('itdisconnect@tty\n'.encode())
-    time.sleep(0.5)
+    bash_socket_send('disconnect', get_connection_type(args.connection))
 
 def send_via_bash():
     """ Python or Bash entry for send commands """
     parser = argparse.ArgumentParser()
     parser.add_argument('text', nargs='+', help='Text to send via Terminal')
+    add_to_argument(parser)
     args = parser.parse_args()
     text = ' '.join(args.text)
-    client_socket_send(f'itsend@{text}\n'.encode())
+    bash_socket_send('send', text, args.to)
 
 def start_log_via_bash():
     """ Python or Bash entry for logstart """
     parser = argparse.ArgumentParser()
-    parser.add_argument('file', help='Save log')
+    parser.add_argument('file', nargs='?', help='Save log, by default <connection name>.log')
+    parser.add_argument(
+        '--flush', choices=('line', 'interval', 'wait'), default='line',
+        help='Flush the log after each line (default), every --flush-interval seconds, '
+        'or only when waitln waits and on logstop'
+    )
+    parser.add_argument(
+        '--flush-interval', type=float, default=1.0, metavar='SECONDS',
+        help='Seconds between flushes with --flush interval'
+    )
+    parser.add_argument('--fsync', action='store_true', help='Sync the log to disk on flush')
+    parser.add_argument(
+        '--rotate-size', default='0', metavar='SIZE',
+        help='Rotate the log once it reaches SIZE bytes, K, M or G, to <file>.<number>'
+    )
+    parser.add_argument(
+        '--rotate-interval', type=float, default=0, metavar='SECONDS',
+        help='Rotate the log every SECONDS'
+    )
+    parser.add_argument(
+        '--compress', choices=('none', 'gzip', 'lzma'), default='none',
+        help='Compress the rotated logs in the background'
+    )
+    parser.add_argument(
+        '--keep', type=int, default=0, metavar='N',
+        help='Remove the oldest rotated logs beyond the last N, by default keep all'
+    )
+    add_to_argument(parser)
     args = parser.parse_args()
-    client_socket_send(f'itlogstart@{args.file}\n'.encode())
+    bash_socket_send('logstart', {
+        'file': args.file, 'flush': args.flush,
+        'interval': args.flush_interval, 'fsync': args.fsync,
+        'rotate_size': args.rotate_size, 'rotate_interval': args.rotate_interval,
+        'compress': args.compress, 'keep': args.keep,
+    }, args.to)
 
 def stop_log_via_bash():
     """ Python or Bash entry for logstop """
-    client_socket_send('itlogstop@\n'.encode())
+    parser = argparse.ArgumentParser()
+    add_to_argument(parser)
+    args = parser.parse_args()
+    bash_socket_send('logstop', to=args.to)
 
 def set_timestamp_via_bash():
     """ Python or Bash entry for set timestamp display """
-    client_socket_send('itset_timestamp@\n'.encode())
+    parser = argparse.ArgumentParser()
+    add_to_argument(parser)
+    args = parser.parse_args()
+    bash_socket_send('set_timestamp', to=args.to)
 
 def set_timeout_via_bash():
     """ Python or Bash entry for set timeout for session """
     parser = argparse.ArgumentParser()
     parser.add_argument('time', type=int, help='milliseconds')
+    add_to_argument(parser)
     args = parser.parse_args()
-    client_socket_send(f'itset_timeout@{args.time}\n'.encode())
+    bash_socket_send('set_timeout', str(args.time), args.to)
 
 def set_pause_via_bash():
     """ Python or Bash entry for time to sleep """
@@ -293,25 +518,54 @@ def set_pause_via_bash():
     parser.add_argument('time', type=int, help='milliseconds')
     args = parser.parse_args()
     pause_time = args.time / 1000
-    client_socket_send(f'itpause@{pause_time}\n'.encode())
+    bash_socket_send('pause', str(pause_time))
 
 def send_log_via_bash():
     """ Python or Bash entry for logwrite commands """
     parser = argparse.ArgumentParser()
     parser.add_argument('text', nargs='+', help='Text to send into log')
+    add_to_argument(parser)
     args = parser.parse_args()
     text = ' '.join(args.text)
-    client_socket_send(f'itsend_log@{text}\n'.encode())
+    bash_socket_send('send_log', text, args.to)
 
 def wait_log_via_bash():
-    """ Python or Bash entry for wait string exist in log or timeout occureed """
+    """ Python or Bash entry for wait string exist in log or timeout occureed.
+
+    Exits with 0 if one of the strings was found, 1 on timeout. With several
+    strings, prints the number of the one found, 1 for the first. The output
+    received since the last send or match is searched first.
+    """
     parser = argparse.ArgumentParser()
-    parser.add_argument('text', nargs='+', help='Text to wait')
+    parser.add_argument('text', nargs='*', help='Texts to wait, the first one received is reported')
+    parser.add_argument(
+        '-e', '--regex', action='append', default=[],
+        help='Regular expression to wait, numbered after the texts, can be repeated'
+    )
+    parser.add_argument(
+        '--since', default='send', metavar='send|now|SECONDS',
+        help='Also search the output received since the last send or match (default), '
+        'only new output, or the output of the last seconds'
+    )
+    add_to_argument(parser)
     args = parser.parse_args()
-    text = ' '.join(args.text)
-    client_socket_send(f'itwait_log@{text}\n'.encode())
+    if not args.text and not args.regex:
+        parser.error('a text or --regex is required')
+    patterns = args.text + [{'regex': regex} for regex in args.regex]
+    match = bash_socket_send(
+        'wait_log', {'patterns': patterns, 'since': args.since}, args.to
+    )
+    if match and len(patterns) > 1:
+        print(match['index'] + 1)
+    sys.exit(0 if match else 1)
 
 def session_stop():
     """ Python or Bash entry for stop session """
-    client_socket_send('itstop@\n'.encode(), True)
-    os.remove(PID_FILE)
+    try:
+        client_socket_send('stop')
+    except (ConnectionRefusedError, ConnectionResetError) as e:
+        print(f'Warning: {e} happened when stopping the session')
+    finally:
+        # Otherwise open_session_start would not start the next session
+        if os.path.exists(PID_FILE):
+            os.remove(PID_FILE)
@@ -0,0 +1,226 @@
+# Copyright 2023 Sony Corporation
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""
+Sockets of the daemons
+
+Daemons listen on a Unix domain socket in a per-user directory, so that several
+users can run them on one host. Set TESTER_DAEMON_SOCKET to 'abstract' to use
+the Linux abstract namespace instead, or to 'tcp' to use the fixed TCP ports on
+localhost. TCP is the default where Unix domain sockets are not available.
+Clients find the daemon on any of them.
+
+The per-user directory must belong to the user and be private. Daemons on
+Unix domain sockets, abstract ones included, only serve clients of the same
+user where the system tells the peer credentials (SO_PEERCRED, Linux). TCP
+ports are open to all local users.
+"""
+
+import errno
+import os
+import socket
+import stat
+import struct
+import sys
+import tempfile
+
+TRANSPORTS = ('unix', 'abstract', 'tcp')
+
+
+def get_default_transport():
+    """Returns the transport daemons listen on.
+    Read from the TESTER_DAEMON_SOCKET environment variable or defaulting to unix."""
+    default = 'unix' if hasattr(socket, 'AF_UNIX') else 'tcp'
+    transport = os.environ.get('TESTER_DAEMON_SOCKET', default)
+    if transport not in TRANSPORTS:
+        raise ValueError(f'Invalid TESTER_DAEMON_SOCKET: {transport}')
+    if transport == 'abstract' and not sys.platform.startswith('linux'):
+        return default
+    if transport != 'tcp' and not hasattr(socket, 'AF_UNIX'):
+        return 'tcp'
+    return transport
+
+
+def _user_id():
+    """Returns an identifier of the current user"""
+    if hasattr(os, 'getuid'):
+        return str(os.getuid())
+    return os.environ.get('USERNAME', 'user')
+
+
+def runtime_dir():
+    """Returns the per-user directory for sockets and PID files"""
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.environ['XDG_RUNTIME_DIR']
+    return os.path.join(tempfile.gettempdir(), f'pyautoport-{_user_id()}')
+
+
+def make_private_dir(path):
+    """Create the directory path for sockets and PID files if necessary.
+
+    Raises PermissionError if it is not a directory only the current user can access,
+    such as one another user created first.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, 'getuid'):
+        return
+    status = os.lstat(path)
+    if (not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid()
+            or status.st_mode & 0o077):
+        raise PermissionError(f'{path} must be a directory only the current user can access')
+
+
+def peer_is_same_user(client_socket):
+    """Returns whether the client of a Unix domain socket runs as the current user.
+
+    True where it cannot be told, for TCP or without SO_PEERCRED.
+    """
+    if client_socket.family != getattr(socket, 'AF_UNIX', None) or not hasattr(
+            socket, 'SO_PEERCRED'):
+        return True
+    credentials = struct.Struct('3i')
+    _, uid, _ = credentials.unpack(client_socket.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, credentials.size  # pylint: disable=no-member
+    ))
+    return uid == os.getuid()
+
+
+def socket_path(name):
+    """Returns the Unix domain socket path of a daemon"""
+    return os.path.join(runtime_dir(), f'pyautoport-{name}.sock')
+
+
+def abstract_address(name):
+    """Returns the Linux abstract namespace address of a daemon"""
+    return f'\0pyautoport-{_user_id()}-{name}'
+
+
+def remove_stale_socket_file(path):
+    """Remove the socket file left by a daemon that did not stop cleanly.
+
+    Raises OSError with errno EADDRINUSE if a daemon still listens on it.
+    """
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)  # pylint: disable=no-member
+    with probe:
+        try:
+            probe.connect(path)
+        except FileNotFoundError:
+            return
+        except ConnectionRefusedError:
+            os.remove(path)
+            return
+    raise OSError(errno.EADDRINUSE, f'A daemon already listens on {path}')
+
+
+def create_server_socket(name, tcp_port):
+    """Returns a listening socket for the daemon called name"""
+    transport = get_default_transport()
+    if transport == 'tcp':
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server_socket.bind(('localhost', tcp_port))
+    else:
+        server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)  # pylint: disable=no-member
+        if transport == 'abstract':
+            server_socket.bind(abstract_address(name))
+        else:
+            make_private_dir(runtime_dir())
+            path = socket_path(name)
+            remove_stale_socket_file(path)
+            server_socket.bind(path)
+    server_socket.listen(5)
+    return server_socket
+
+
+def describe(server_socket):
+    """Returns where a listening socket can be reached, for messages"""
+    address = server_socket.getsockname()
+    if isinstance(address, tuple):
+        return f'port {address[1]}'
+    if isinstance(address, bytes):
+        address = address.decode(errors='replace')
+    return f'socket {address.lstrip(chr(0))}'
+
+
+def remove_socket_file(address):
+    """Remove the file of a Unix domain socket address, if it has one"""
+    if isinstance(address, str) and address and not address.startswith('\0'):
+        try:
+            os.remove(address)
+        except FileNotFoundError:
+            pass
+
+
+def close_server_socket(server_socket):
+    """Close a listening socket and remove its file"""
+    address = server_socket.getsockname()
+    server_socket.close()
+    remove_socket_file(address)
+
+
+def unix_addresses(name):
+    """Returns the Unix domain socket addresses the daemon called name may listen on"""
+    addresses = []
+    if hasattr(socket, 'AF_UNIX'):
+        addresses.append(socket_path(name))
+        if sys.platform.startswith('linux'):
+            addresses.append(abstract_address(name))
+    return addresses
+
+
+def connect(name, tcp_port, timeout=None):
+    """Returns a socket connected to the daemon called name.
+
+    The Unix domain socket, the abstract address and the TCP port are tried in
+    this order. Raises ConnectionRefusedError if the daemon is not running.
+    """
+    for address in unix_addresses(name):
+        client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)  # pylint: disable=no-member
+        try:
+            client_socket.connect(address)
+        except (FileNotFoundError, ConnectionRefusedError):
+            client_socket.close()
+            continue
+        client_socket.settimeout(timeout)
+        return client_socket
+    return socket.create_connection(('localhost', tcp_port), timeout)
+
+
+async def open_connection(name, tcp_port):
+    """Returns the asyncio (reader, writer) connected to the daemon called name.
+
+    Addresses are tried as in connect.
+    """
+    # Already imported by the running event loop, clients of connect do not need it
+    import asyncio  # pylint: disable=import-outside-toplevel
+    for address in unix_addresses(name):
+        try:
+            return await asyncio.open_unix_connection(address)
+        except (FileNotFoundError, ConnectionRefusedError):
+            continue
+    return await asyncio.open_connection('localhost', tcp_port)
@@ -0,0 +1,523 @@
+# Copyright 2023 Sony Corporation
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""
+TeraTerm Mode - TTL script runner
+
+Runs a whole script of TeraTerm-mode commands in one process, either against
+an in-process ConnectSession or over one connection to session_start.
+
+Besides the commands, scripts may use:
+
+    ; comment, or # at the start of a line
+    name = expression            integers, 'strings', + - * / %, = <> < > <= >=, && || !
+    send echo $name ${name}      variables are expanded in command arguments
+    connect uart main            names a connection, by default tty or adb
+    connect uart pmic /dev/ttyUSB2 115200
+    send --to main text          runs a command on a connection, by default the last connected
+    for i 1 10 ... next
+    while expression ... endwhile
+    if expression then ... elseif expression then ... else ... endif
+    if expression command        on one line, without spaces in expression
+    if waitln text then ... endif
+    break, continue, exit [expression]
+
+waitln text... and waitregex regex... set result to the number of the text found
+(1 for the first), 0 on timeout, inputstr to its line and groupmatchstr1 to 9 to
+the regex groups.
+"""
+
+import argparse
+import ast
+import collections
+import functools
+import operator
+import re
+import shlex
+import sys
+from pyautoport import teraterm
+
+Command = collections.namedtuple('Command', 'lineno text')
+Assign = collections.namedtuple('Assign', 'lineno name expression')
+Keyword = collections.namedtuple('Keyword', 'lineno word argument')
+For = collections.namedtuple('For', 'lineno name start end body')
+While = collections.namedtuple('While', 'lineno condition body')
+If = collections.namedtuple('If', 'lineno branches orelse')
+
+KEYWORDS = ('break', 'continue', 'exit', 'end')
+ASSIGNMENT = re.compile(r'([A-Za-z_]\w*)\s*=(?!=)\s*(.*)\Z')
+VARIABLE = re.compile(r'\$(?:\{(\w+)\}|(\w+))')
+STRING = re.compile(r'''('[^']*'|"[^"]*")''')
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+COMPARE_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+
+def connection_arg(words):
+    """Returns the argument of connect/disconnect uart|adb [options]"""
+    return ' '.join([{'uart': 'tty'}.get(words[0], words[0])] + words[1:])
+
+
+def split_connection(words):
+    """Returns (words, connection name) of connect type name ... or command --to name ..."""
+    if words[0].lower() == 'connect' and len(words) > 2:
+        return words[:2] + words[3:], words[2]
+    if len(words) > 2 and words[1] == '--to':
+        return words[:1] + words[3:], words[2]
+    return words, None
+
+
+def wait_patterns(words):
+    """Returns the texts of waitln, at least one"""
+    if not words:
+        raise IndexError('no text')
+    return words
+
+
+# TTL command: (session command, function returning its argument from the TTL arguments)
+COMMANDS = {
+    'connect': ('connect', connection_arg),
+    'disconnect': ('disconnect', connection_arg),
+    'send': ('send', ' '.join),
+    'sendln': ('send', ' '.join),
+    'waitln': ('wait_log', wait_patterns),  # sets result, inputstr
+    'waitregex': ('wait_log', lambda words: [{'regex': regex} for regex in wait_patterns(words)]),
+    'mpause': ('pause', lambda words: int(words[0]) / 1000),
+    'pause': ('pause', lambda words: int(words[0])),
+    'logstart': ('logstart', lambda words: words[0]),
+    'logwrite': ('send_log', ' '.join),
+    'logstop': ('logstop', lambda words: ''),
+    'set_timestamp': ('set_timestamp', lambda words: ''),
+    'set_timeout': ('set_timeout', lambda words: words[0]),
+    'getenv': ('get_env', lambda words: words[0]),  # getenv name [variable]
+    'setenv': ('set_env', lambda words: f'{words[0]} {words[1]}'),
+}
+
+
+class TtlError(Exception):
+    """Invalid script, or command that failed"""
+
+
+class UnsupportedExpression(TtlError):
+    """Python syntax that TTL expressions do not have"""
+
+
+class Break(Exception):
+    """Leave the innermost loop"""
+
+
+class Continue(Exception):
+    """Start the next iteration of the innermost loop"""
+
+
+class Exit(Exception):
+    """Stop the script with an exit status"""
+
+    def __init__(self, status=0):
+        super().__init__(status)
+        self.status = status
+
+
+# Parsing
+def strip_comment(line):
+    """Returns line without its ; comment, keeping ; inside quotes"""
+    parts = STRING.split(line)
+    for i in range(0, len(parts), 2):
+        if ';' in parts[i]:
+            return ''.join(parts[:i]) + parts[i][:parts[i].index(';')]
+    return line
+
+
+def parse_ttl(text):
+    """Returns the statements of a script"""
+    lines = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = strip_comment(line).strip()
+        if line and not line.startswith('#'):
+            lines.append((lineno, line))
+    block, _, _ = parse_block(lines, 0, ())
+    return block
+
+
+def parse_block(lines, index, terminators):
+    """Parse statements until one of the terminators.
+
+    Returns (statements, index of the terminator line, terminator word).
+    """
+    block = []
+    while index < len(lines):
+        lineno, line = lines[index]
+        words = line.split()
+        word = words[0].lower()
+        if word in terminators:
+            return block, index, word
+        index += 1
+        if word == 'for':
+            if len(words) != 4:
+                raise TtlError(f'line {lineno}: expected for <variable> <start> <end>')
+            body, index, _ = parse_block(lines, index, ('next',))
+            block.append(For(lineno, words[1], words[2], words[3], body))
+            index += 1
+        elif word == 'while':
+            body, index, _ = parse_block(lines, index, ('endwhile',))
+            block.append(While(lineno, line[len(word):].strip(), body))
+            index += 1
+        elif word == 'if' and words[-1].lower() == 'then':
+            statement, index = parse_if(lines, index, lineno, line)
+            block.append(statement)
+        elif word == 'if':
+            # One line if: the condition is the first word
+            if len(words) < 3:
+                raise TtlError(f'line {lineno}: expected if <condition> <statement>')
+            statement = line.split(None, 2)[2]
+            block.append(If(lineno, [(words[1], [parse_simple(lineno, statement)])], []))
+        elif word in ('next', 'endwhile', 'elseif', 'else', 'endif'):
+            raise TtlError(f'line {lineno}: unexpected {word}')
+        else:
+            block.append(parse_simple(lineno, line))
+    if terminators:
+        raise TtlError(f'missing {terminators[-1]} at the end of the script')
+    return block, index, None
+
+
+def parse_if(lines, index, lineno, line):
+    """Parse if ... then up to its endif, returns (If, index after endif)"""
+    branches = []
+    orelse = []
+    condition = line.split(None, 1)[1].rsplit(None, 1)[0]
+    while True:
+        body, index, end = parse_block(lines, index, ('elseif', 'else', 'endif'))
+        branches.append((condition, body))
+        if end != 'elseif':
+            break
+        words = lines[index][1].split(None, 1)
+        if len(words) < 2 or words[1].split()[-1].lower() != 'then':
+            raise TtlError(f'line {lines[index][0]}: expected elseif <condition> then')
+        condition = words[1].rsplit(None, 1)[0]
+        index += 1
+    if end == 'else':
+        orelse, index, _ = parse_block(lines, index + 1, ('endif',))
+    return If(lineno, branches, orelse), index + 1
+
+
+def parse_simple(lineno, line):
+    """Parse a statement that is not a block"""
+    word, _, argument = line.partition(' ')
+    if word.lower() in KEYWORDS:
+        return Keyword(lineno, word.lower(), argument.strip())
+    match = ASSIGNMENT.match(line)
+    if match:
+        return Assign(lineno, match.group(1), match.group(2))
+    return Command(lineno, line)
+
+
+# Expressions
+def to_python(expression):
+    """Turns TTL operators into Python ones, leaving strings alone"""
+    parts = STRING.split(expression)
+    for i in range(0, len(parts), 2):
+        part = parts[i].replace('<>', '!=').replace('&&', ' and ').replace('||', ' or ')
+        part = re.sub(r'!(?!=)', ' not ', part)
+        parts[i] = re.sub(r'(?<![=!<>])=(?!=)', '==', part)
+    return ''.join(parts).strip()
+
+
+def evaluate(expression, variables):
+    """Returns the value of an expression, an int or a str"""
+    try:
+        tree = ast.parse(to_python(expression), mode='eval')
+    except SyntaxError as e:
+        raise TtlError(f'invalid expression: {expression}') from e
+    try:
+        return evaluate_node(tree.body, variables)
+    except UnsupportedExpression as e:
+        raise TtlError(f'unsupported expression: {expression}') from e
+
+
+def evaluate_node(node, variables):
+    """Returns the value of an expression tree"""
+    # pylint: disable=too-many-return-statements
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, str)):
+        return node.value
+    if isinstance(node, ast.Name):
+        if node.id not in variables:
+            raise TtlError(f'undefined variable: {node.id}')
+        return variables[node.id]
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        left = evaluate_node(node.left, variables)
+        right = evaluate_node(node.right, variables)
+        try:
+            return BINARY_OPERATORS[type(node.op)](left, right)
+        except (TypeError, ZeroDivisionError) as e:
+            raise TtlError(f'{e} in expression') from e
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        operand = evaluate_node(node.operand, variables)
+        try:
+            return -operand
+        except TypeError as e:
+            raise TtlError(f'{e} in expression') from e
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return int(not evaluate_node(node.operand, variables))
+    if isinstance(node, ast.BoolOp):
+        values = (evaluate_node(value, variables) for value in node.values)
+        return int(all(values) if isinstance(node.op, ast.And) else any(values))
+    if isinstance(node, ast.Compare) and all(type(op) in COMPARE_OPERATORS for op in node.ops):
+        return evaluate_compare(node, variables)
+    raise UnsupportedExpression(type(node).__name__)
+
+
+
+def evaluate_compare(node, variables):
+    """Returns 1 if all comparisons of a chain are true, else 0"""
+    left = evaluate_node(node.left, variables)
+    for op, comparator in zip(node.ops, node.comparators):
+        right = evaluate_node(comparator, variables)
+        try:
+            if not COMPARE_OPERATORS[type(op)](left, right):
+                return 0
+        except TypeError as e:
+            raise TtlError(f'{e} in expression') from e
+        left = right
+    return 1
+
+
+# Running
+class TtlRunner:
+    """Runs statements, sending commands with request(command, arg).
+
+    request returns the response fields of the session daemon, see teraterm.
+    """
+
+    def __init__(self, request, variables=None):
+        self.request = request
+        self.variables = {'result': 0}
+        self.variables.update(variables or {})
+
+    def call(self, command, arg='', to=None):
+        """Run a command of the session on connection to, returns its value"""
+        # Arguments are strings, but for lists of waitln texts
+        response = self.request(command, arg if isinstance(arg, list) else str(arg), to)
+        if response.get('status') != 'ok':
+            raise TtlError(response.get('message', f'{command} failed'))
+        return response.get('value')
+
+    def run(self, block):
+        """Run statements, with line numbers added to errors"""
+        for statement in block:
+            try:
+                self.run_statement(statement)
+            except TtlError as e:
+                if str(e).startswith('line '):
+                    raise
+                raise TtlError(f'line {statement.lineno}: {e}') from e
+
+    def run_statement(self, statement):
+        """Run one statement"""
+        if isinstance(statement, Command):
+            self.run_command(statement.text)
+        elif isinstance(statement, Assign):
+            self.variables[statement.name] = evaluate(statement.expression, self.variables)
+        elif isinstance(statement, Keyword):
+            self.run_keyword(statement)
+        elif isinstance(statement, For):
+            self.run_for(statement)
+        elif isinstance(statement, While):
+            while self.test(statement.condition):
+                if not self.run_loop_body(statement.body):
+                    break
+        elif isinstance(statement, If):
+            for condition, body in statement.branches:
+                if self.test(condition):
+                    self.run(body)
+                    break
+            else:
+                self.run(statement.orelse)
+
+    def run_keyword(self, statement):
+        """Run break, continue or exit"""
+        if statement.word == 'break':
+            raise Break()
+        if statement.word == 'continue':
+            raise Continue()
+        status = evaluate(statement.argument, self.variables) if statement.argument else 0
+        raise Exit(status)
+
+    def run_for(self, statement):
+        """Run a for loop, both bounds included"""
+        start = evaluate(statement.start, self.variables)
+        end = evaluate(statement.end, self.variables)
+        try:
+            step = 1 if end >= start else -1
+            values = range(start, end + step, step)
+        except TypeError as e:
+            raise TtlError(f'for bounds must be integers, not {start!r} and {end!r}') from e
+        for value in values:
+            self.variables[statement.name] = value
+            if not self.run_loop_body(statement.body):
+                break
+
+    def run_loop_body(self, body):
+        """Returns False if the loop must stop"""
+        try:
+            self.run(body)
+        except Break:
+            return False
+        except Continue:
+            pass
+        return True
+
+    def set_wait_result(self, match):
+        """Sets result to the number of the text found, 0 on timeout, inputstr to
+        its line and groupmatchstr1 to 9 to the regex groups"""
+        self.variables['result'] = match['index'] + 1 if match else 0
+        if match:
+            self.variables['inputstr'] = match['line']
+            groups = list(match['groups'])[:9]
+            for number, group in enumerate(groups + [''] * (9 - len(groups)), 1):
+                self.variables[f'groupmatchstr{number}'] = group or ''
+
+    def test(self, condition):
+        """Returns whether a condition is true, running it if it is a command"""
+        words = condition.split()
+        if words and words[0].lower() in COMMANDS:
+            self.run_command(condition)
+            return bool(self.variables['result'])
+        return bool(evaluate(condition, self.variables))
+
+    def expand(self, text):
+        """Returns text with $name and ${name} replaced by variable values"""
+        def value(match):
+            name = match.group(1) or match.group(2)
+            if name not in self.variables:
+                raise TtlError(f'undefined variable: {name}')
+            return str(self.variables[name])
+        return VARIABLE.sub(value, text)
+
+    def run_command(self, text):
+        """Run one command line"""
+        try:
+            words = [self.expand(word) for word in shlex.split(text)]
+        except ValueError as e:
+            raise TtlError(str(e)) from e
+        command = words[0].lower()
+        if command not in COMMANDS:
+            raise TtlError(f'unknown command: {words[0]}')
+        session_command, get_arg = COMMANDS[command]
+        words, to = split_connection(words)
+        try:
+            arg = get_arg(words[1:])
+        except IndexError as e:
+            raise TtlError(f'missing argument for {command}') from e
+        except ValueError as e:
+            raise TtlError(f'invalid argument for {command}: {e}') from e
+        value = self.call(session_command, arg, to)
+        if command in ('waitln', 'waitregex'):
+            self.set_wait_result(value)
+        elif command == 'getenv' and len(words) > 2:
+            self.variables[words[2]] = '' if value is None else value
+        elif command == 'getenv':
+            print(value)
+
+
+def run_ttl(script, daemon=False, variables=None):
+    """Run a script, returns the exit status.
+
+    Commands are run in this process, or by the session daemon over one connection
+    if daemon. Raises TtlError if the script is invalid or a command failed.
+    """
+    block = parse_ttl(script)
+    if daemon:
+        with teraterm.SessionClient() as client:
+            return run_block(TtlRunner(client.request, variables), block)
+    from pyautoport.session import ConnectSession  # pylint: disable=import-outside-toplevel
+    session = ConnectSession()
+    try:
+        return run_block(
+            TtlRunner(functools.partial(teraterm.run_command, session), variables),
+            block
+        )
+    finally:
+        teraterm.close_conn(session, 'all', None)
+
+
+def run_block(runner, block):
+    """Run statements to the end or exit, returns the exit status"""
+    try:
+        runner.run(block)
+    except Exit as e:
+        return e.status
+    except (Break, Continue) as e:
+        raise TtlError(f'{type(e).__name__.lower()} outside of a loop') from e
+    return 0
+
+
+# PUBLIC API
+
+
+def run_ttl_via_bash():
+    """Bash entry for running a TTL script"""
+    parser = argparse.ArgumentParser(description='Run a script of TeraTerm-mode commands')
+    parser.add_argument('script', help='Script file, - for stdin')
+    parser.add_argument(
+        '-d', '--daemon', action='store_true',
+        help='Run the commands in the session started by session_start'
+    )
+    parser.add_argument(
+        '-v', '--var', action='append', default=[], metavar='NAME=VALUE',
+        help='Set a string variable before running the script, can be repeated'
+    )
+    args = parser.parse_args()
+
+    variables = dict(var.partition('=')[::2] for var in args.var)
+    if args.script == '-':
+        script = sys.stdin.read()
+    else:
+        with open(args.script, 'r', encoding='utf-8') as file:
+            script = file.read()
+    try:
+        status = run_ttl(script, args.daemon, variables)
+    except TtlError as e:
+        print(f'{args.script}: {e}', file=sys.stderr)
+        sys.exit(1)
+    except ConnectionRefusedError:
+        print('Did you run session_start &', file=sys.stderr)
+        sys.exit(1)
+    sys.exit(status if isinstance(status, int) else 1)
@@ -32,10 +32,25 @@ UART Basic Mode
 """
 
 import argparse
+import atexit
+import codecs
+import json
+import threading
 import time
 import os
+import re
 import serial
 
+PACING_MODES = ('bulk', 'chunk', 'char')
+FLOW_CONTROLS = ('none', 'rtscts', 'xonxoff')
+DEFAULT_CHUNK_SIZE = 16
+DEFAULT_PACING_DELAY = 0.05
+DEFAULT_PROMPT = r'[#$>] ?\Z'
+DRAIN_INTERVAL = 0.05
+DRAIN_BUFFER_SIZE = 1024 * 1024
+# Seconds to wait at exit for a port in use, such as by an unfinished iter_uart
+EXIT_CLOSE_TIMEOUT = 0.5
+
 def get_default_port():
     """Returns the default UART port.
     Read from the TESTER_UART_PORT environment variable or defaulting to /dev/ttyUSB0."""
@@ -50,17 +65,283 @@ def get_default_baudrate():
     baudrate = os.environ.get("TESTER_UART_BAUDRATE", "115200")
     return baudrate
 
-def write_and_read_uart(text, uart_timeout, port=None, baudrate=None):
-    """Writes text to the UART and reads all available lines until a timeout.
+def get_default_idle_timeout():
+    """Returns the time an unused UART port is kept open in seconds.
+    Read from the TESTER_UART_IDLE_TIMEOUT environment variable or defaulting to 60."""
+    return float(os.environ.get("TESTER_UART_IDLE_TIMEOUT", "60"))
+
+def get_flow_control_settings(flow_control=None):
+    """Returns the serial.Serial keyword arguments for a flow control mode.
+
+    Args:
+        flow_control: One of FLOW_CONTROLS. None is the same as 'none'.
+
+    Returns:
+        A dict to be passed to serial.Serial.
+    """
+    if flow_control in (None, 'none'):
+        return {}
+    if flow_control == 'rtscts':
+        return {'rtscts': True}
+    if flow_control == 'xonxoff':
+        return {'xonxoff': True}
+    raise ValueError(f'Invalid flow control: {flow_control}')
+
+def write_uart(uart, text, pacing='bulk', chunk_size=DEFAULT_CHUNK_SIZE,
+               delay=DEFAULT_PACING_DELAY):
+    """Writes text to an open UART using the given pacing mode.
+
+    Args:
+        uart: An open serial.Serial instance.
+        text: The text to write to the UART.
+        pacing: 'bulk' writes everything at once, 'chunk' writes chunk_size
+            bytes at a time and 'char' writes one character at a time.
+        chunk_size: Number of bytes per write in 'chunk' mode.
+        delay: Time to sleep after each write in 'chunk' and 'char' mode.
+    """
+    if pacing == 'bulk':
+        uart.write(text.encode('utf-8'))
+    elif pacing == 'chunk':
+        data = text.encode('utf-8')
+        for index in range(0, len(data), max(1, chunk_size)):
+            uart.write(data[index:index + max(1, chunk_size)])
+            time.sleep(delay)
+    elif pacing == 'char':
+        for char_to_encode in text:
+            uart.write(char_to_encode.encode('utf-8'))
+            time.sleep(delay)
+    else:
+        raise ValueError(f'Invalid pacing mode: {pacing}')
+    uart.flush()
+
+class PooledPort:
+    """An open UART kept by UartPortPool.
+
+    While nobody holds the port, a drain thread copies whatever the device prints
+    into a buffer so that the next caller can see it.
+    """
+
+    def __init__(self, pool, key, uart):
+        self.pool = pool
+        self.key = key
+        self.uart = uart
+        self.lock = threading.Lock()
+        self.buffer = bytearray()
+        self.last_used = time.monotonic()
+        self.event_stop = threading.Event()
+        threading.Thread(target=self._drain, daemon=True).start()
+
+    def _drain(self):
+        """Buffer output of the idle port and close it when idle for too long"""
+        while not self.event_stop.wait(DRAIN_INTERVAL):
+            if not self.lock.acquire(blocking=False):  # pylint: disable=consider-using-with
+                continue
+            try:
+                if time.monotonic() - self.last_used > self.pool.idle_timeout:
+                    self.pool.discard(self)
+                    return
+                waiting = self.uart.in_waiting
+                if waiting:
+                    self.buffer += self.uart.read(waiting)
+                    del self.buffer[:-DRAIN_BUFFER_SIZE]
+            except (serial.SerialException, OSError):
+                self.pool.discard(self)
+                return
+            finally:
+                self.lock.release()
+
+    def take_buffer(self):
+        """Returns and clears the output buffered while the port was idle"""
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+    def close(self):
+        """Stop draining and close the UART"""
+        self.event_stop.set()
+        self.uart.close()
+
+
+class UartPortPool:
+    """Keeps UART ports open between calls, keyed by (port, baudrate, settings)."""
+
+    def __init__(self, idle_timeout=None):
+        self.idle_timeout = get_default_idle_timeout() if idle_timeout is None else idle_timeout
+        self.lock = threading.Lock()
+        self.ports = {}
+
+    def acquire(self, port, baudrate, uart_timeout, flow_control=None):
+        """Returns a locked PooledPort, opening the UART if necessary.
+
+        The caller must hand it back with release().
+        """
+        key = (port, int(baudrate), flow_control or 'none')
+        while True:
+            with self.lock:
+                pooled = self.ports.get(key)
+                if pooled is None:
+                    uart = serial.Serial(
+                            port=port,
+                            baudrate=int(baudrate),
+                            timeout=uart_timeout,
+                            **get_flow_control_settings(flow_control)
+                    )
+                    pooled = PooledPort(self, key, uart)
+                    self.ports[key] = pooled
+            pooled.lock.acquire()  # pylint: disable=consider-using-with
+            if not pooled.event_stop.is_set():
+                break
+            # Evicted while waiting for the lock, open it again
+            pooled.lock.release()
+        if pooled.uart.timeout != uart_timeout:
+            pooled.uart.timeout = uart_timeout
+        return pooled
+
+    def release(self, pooled, keep_open=True):
+        """Hands a port back to the pool, or closes it if keep_open is False"""
+        pooled.last_used = time.monotonic()
+        if not keep_open:
+            self.discard(pooled)
+        pooled.lock.release()
+
+    def discard(self, pooled):
+        """Removes a port from the pool and closes it"""
+        with self.lock:
+            if self.ports.get(pooled.key) is pooled:
+                del self.ports[pooled.key]
+        pooled.close()
+
+    def close(self, port=None, timeout=-1):
+        """Closes all pooled ports, or only the ones opened on port.
+
+        A port in use is closed once released, or after timeout seconds if not -1.
+        """
+        with self.lock:
+            closing = [pooled for key, pooled in self.ports.items()
+                       if port is None or key[0] == port]
+        for pooled in closing:
+            locked = pooled.lock.acquire(timeout=timeout)  # pylint: disable=consider-using-with
+            try:
+                self.discard(pooled)
+            finally:
+                if locked:
+                    pooled.lock.release()
+
+
+UART_POOL = UartPortPool()
+
+def close_uart_ports(port=None):
+    """Closes UART ports kept open by write_and_read_uart.
+
+    Args:
+        port: Close only this port. If None, all ports are closed.
+    """
+    UART_POOL.close(port)
+
+def _close_uart_ports_at_exit():
+    """Closes all UART ports, a suspended iter_uart generator never releases its port"""
+    UART_POOL.close(timeout=EXIT_CLOSE_TIMEOUT)
+
+atexit.register(_close_uart_ports_at_exit)
+
+def _decode_line(line):
+    """Decodes one line read from the UART, falling back to hex"""
+    try:
+        return f"""{line.decode('utf-8').strip()}\n"""
+    except UnicodeDecodeError:
+        return f"""{line.hex()}\n"""
+
+def _split_lines(data):
+    """Splits data into complete lines and the remaining partial line"""
+    end = data.rfind(b'\n') + 1
+    return [line + b'\n' for line in data[:end].split(b'\n')[:-1]], data[end:]
+
+def _iter_raw(uart, pending=b'', until=None, chunks=False):
+    """Yields the pending output and then lines, or chunks, read from the UART.
+
+    Reading stops when nothing arrives within uart.timeout or as soon as until
+    matches output read from the UART. Returns whether until matched.
+    """
+    matched = False
+    if chunks:
+        tail = b''
+        if pending:
+            yield pending
+    else:
+        lines, tail = _split_lines(pending)
+        yield from lines
+    while True:
+        if until is None and not chunks:
+            data = uart.readline()
+        else:
+            data = uart.read(max(1, uart.in_waiting))
+        if not data:
+            break
+        # Only the current line is searched again, prompts have no newline
+        tail += data
+        matched = until is not None and until.search(tail.decode('utf-8', errors='replace'))
+        if chunks:
+            yield data
+            tail = tail[tail.rfind(b'\n') + 1:]
+        else:
+            lines, tail = _split_lines(tail)
+            yield from lines
+        if matched:
+            break
+    if tail and not chunks:
+        yield tail
+    return bool(matched)
+
+def _iter_decoded(items, chunks=False):
+    """Decodes lines like write_and_read_uart, or chunks with an incremental decoder.
+
+    Returns what the items generator returns.
+    """
+    if chunks:
+        decode = codecs.getincrementaldecoder('utf-8')(errors='replace').decode
+    else:
+        decode = _decode_line
+    while True:
+        try:
+            item = next(items)
+        except StopIteration as stop:
+            return stop.value
+        yield decode(item)
+
+def _read_all(items):
+    """Returns the list of what a generator yields and what it returns"""
+    values = []
+    while True:
+        try:
+            values.append(next(items))
+        except StopIteration as stop:
+            return values, stop.value
+
+# pylint: disable-next=too-many-arguments
+def iter_uart(text, uart_timeout, port=None, baudrate=None, *,
+              pacing='bulk', flow_control=None,
+              chunk_size=DEFAULT_CHUNK_SIZE, delay=DEFAULT_PACING_DELAY,
+              keep_open=True, until=None, chunks=False, raw=False):
+    """Writes text to the UART and yields the reply as it arrives.
+
+    The port is opened when the first item is requested and released when the
+    generator is exhausted or closed.
 
     Args:
         text: The text to write to the UART.
         uart_timeout: The timeout for UART operations.
         port: The UART port to use. If None, the default port is used.
         baudrate: The baudrate to use. If None, the default baudrate is used.
+        pacing, flow_control, chunk_size, delay, keep_open, until:
+            See write_and_read_uart.
+        chunks: Yield data as soon as it is read instead of line by line.
+        raw: Yield bytes without decoding.
+
+    Yields:
+        Lines (or chunks) of the reply, as str or as bytes if raw is True.
 
     Returns:
-        A string containing the reply received from the UART.
+        Whether until matched the output read after text was written.
     """
 
     if port is None:
@@ -68,59 +349,190 @@ def write_and_read_uart(text, uart_timeout, port=None, baudrate=None):
     if baudrate is None:
         baudrate = get_default_baudrate()
 
-    # Open UART connection
-    uart = serial.Serial(
-            port=port,
-            baudrate=int(baudrate),
-            timeout=uart_timeout
-    )
+    # Open UART connection or reuse an open one
+    pooled = UART_POOL.acquire(port, baudrate, uart_timeout, flow_control)
+    try:
+        pending = pooled.take_buffer()
 
-    # Send text to UART
-    for byte_to_encode in text:
-        uart.write(byte_to_encode.encode('utf-8'))
-        time.sleep(0.05)
+        # Send text to UART
+        write_uart(pooled.uart, text, pacing=pacing, chunk_size=chunk_size, delay=delay)
 
-    # Read and print all lines from UART until timeout
-    reply = ''
-    while True:
-        line = uart.readline()
-        if not line:
-            break
+        # Yield all lines from UART until timeout
+        items = _iter_raw(pooled.uart, pending,
+                          None if until is None else re.compile(until), chunks)
+        return (yield from items if raw else _iter_decoded(items, chunks))
+    except (serial.SerialException, OSError):
+        keep_open = False
+        raise
+    finally:
+        # Close UART connection unless it is kept for the next call
+        UART_POOL.release(pooled, keep_open)
+
+# pylint: disable-next=too-many-arguments
+def write_and_read_uart(text, uart_timeout, port=None, baudrate=None, *,
+                        pacing='bulk', flow_control=None,
+                        chunk_size=DEFAULT_CHUNK_SIZE, delay=DEFAULT_PACING_DELAY,
+                        keep_open=True, until=None, raw=False):
+    """Writes text to the UART and reads all available lines until a timeout.
+
+    Args:
+        text: The text to write to the UART.
+        uart_timeout: The timeout for UART operations.
+        port: The UART port to use. If None, the default port is used.
+        baudrate: The baudrate to use. If None, the default baudrate is used.
+        pacing: How text is written, see write_uart. Defaults to one bulk write.
+        flow_control: 'none', 'rtscts' or 'xonxoff'.
+        chunk_size: Number of bytes per write in 'chunk' pacing mode.
+        delay: Time to sleep after each write in 'chunk' and 'char' pacing mode.
+        keep_open: Keep the port open for the next call. Output printed by the
+            device between calls is included at the beginning of the next reply.
+        until: A regular expression (e.g. DEFAULT_PROMPT). If given, reading stops
+            as soon as it appears instead of waiting for uart_timeout of silence.
+        raw: Return the bytes received without decoding.
+
+    Returns:
+        A string containing the reply received from the UART, or bytes if raw is True.
+    """
+    return (b'' if raw else '').join(iter_uart(
+        text, uart_timeout, port, baudrate,
+        pacing=pacing, flow_control=flow_control,
+        chunk_size=chunk_size, delay=delay,
+        keep_open=keep_open, until=until, raw=raw
+    ))
+
+def parse_uart_batch(lines):
+    """Returns the commands of a batch script for run_uart_batch.
+
+    Each line is one command, either plain text or a JSON object with the text and
+    optionally its own pattern and timeout, e.g. {"text": "ls", "until": "# ", "timeout": 2}.
+    Empty lines and lines starting with '#' are skipped.
+    """
+    commands = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
         try:
-            reply += f"""{line.decode('utf-8').strip()}\n"""
-        except UnicodeDecodeError:
-            reply += line.hex()
+            command = json.loads(line)
+        except ValueError:
+            command = None
+        if not isinstance(command, dict) or 'text' not in command:
+            command = {'text': line}
+        commands.append(command)
+    return commands
 
-    # Close UART connection
-    uart.close()
-    return reply
+def run_uart_batch(commands, uart_timeout, until=None, **options):
+    """Sends commands one after another over the same open UART.
 
-def uart_send():
-    """Python wrapper to provide consistant command name"""
+    Args:
+        commands: Dicts with 'text' and optionally 'until' and 'timeout'.
+        uart_timeout: The timeout for commands without their own.
+        until: The pattern for commands without their own.
+        **options: port, baudrate, pacing, flow_control, chunk_size and delay,
+            see write_and_read_uart.
 
-    # Parse command-line arguments
+    Yields:
+        A dict per command with its text, reply, whether the pattern matched
+        (None without pattern) and the elapsed seconds.
+    """
+    for command in commands:
+        command_until = command.get('until', until)
+        start = time.monotonic()
+        chunks, matched = _read_all(iter_uart(
+            f"{command['text']}\n", command.get('timeout', uart_timeout),
+            until=command_until, chunks=True, raw=True, **options
+        ))
+        lines, tail = _split_lines(b''.join(chunks))
+        yield {
+            'text': command['text'],
+            'reply': ''.join(_iter_decoded(iter(lines + [tail] if tail else lines))),
+            'matched': None if command_until is None else matched,
+            'elapsed': round(time.monotonic() - start, 3),
+        }
+
+def _uart_send_parser():
+    """Returns the command-line parser of uart_send"""
     parser = argparse.ArgumentParser()
-    parser.add_argument('text', nargs='+', help='Text to send via UART')
+    parser.add_argument('text', nargs='*', help='Text to send via UART')
     parser.add_argument(
         '-t', '--timeout', type=float,
         help='Time to wait before stop reading'
     )
+    parser.add_argument(
+        '-p', '--pacing', choices=PACING_MODES, default='bulk',
+        help='Write all text at once (bulk), chunk by chunk or char by char'
+    )
+    parser.add_argument(
+        '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+        help='Bytes per write in chunk pacing mode'
+    )
+    parser.add_argument(
+        '--delay', type=float, default=DEFAULT_PACING_DELAY,
+        help='Seconds to wait after each write in chunk or char pacing mode'
+    )
+    parser.add_argument(
+        '-f', '--flow', choices=FLOW_CONTROLS, default='none',
+        help='Flow control of the UART'
+    )
+    parser.add_argument(
+        '-u', '--until', metavar='PATTERN',
+        help='Stop reading as soon as this regular expression appears'
+    )
+    parser.add_argument(
+        '--prompt', action='store_const', dest='until', const=DEFAULT_PROMPT,
+        help='Stop reading as soon as a shell prompt appears'
+    )
+    parser.add_argument(
+        '-b', '--batch', metavar='FILE', type=argparse.FileType('r', encoding='utf-8'),
+        help='Send each line of FILE (- for stdin) as a command over one open port'
+    )
+    parser.add_argument(
+        '-o', '--output', metavar='FILE', type=argparse.FileType('w', encoding='utf-8'),
+        help='Write one JSON line per command to FILE (- for stdout) in batch mode'
+    )
+    return parser
+
+def uart_send():
+    """Python wrapper to provide consistant command name"""
+
+    # Parse command-line arguments
+    parser = _uart_send_parser()
     args = parser.parse_args()
+    if not args.text and args.batch is None:
+        parser.error('text or --batch is required')
+    if args.output is not None and args.batch is None:
+        parser.error('--output requires --batch')
 
-    # Set adb_timeout if necessary
+    # Set uart_timeout if necessary
     if args.timeout is not None:
         uart_timeout = args.timeout
     else:
         uart_timeout = 0.5
 
-    # Combine text argument into a single string
-    text = ' '.join(args.text)
-
-    # Append newline character to text
-    text += '\n'
+    options = {
+        'pacing': args.pacing, 'flow_control': args.flow,
+        'chunk_size': args.chunk_size, 'delay': args.delay,
+    }
 
     try:
-        print(write_and_read_uart(text, uart_timeout))
+        if args.batch is not None:
+            with args.batch:
+                commands = parse_uart_batch(args.batch)
+            for result in run_uart_batch(commands, uart_timeout, args.until, **options):
+                if args.output is not None:
+                    args.output.write(json.dumps(result) + '\n')
+                    args.output.flush()
+                else:
+                    print(result['reply'])
+            return
+
+        # Combine text argument into a single string
+        text = ' '.join(args.text)
+
+        # Append newline character to text
+        text += '\n'
+
+        print(write_and_read_uart(text, uart_timeout, until=args.until, **options))
     except serial.serialutil.SerialException:
         print(f'''
 Can\'t Open {get_default_port()}. Did you set port using:
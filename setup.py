@@ -67,9 +67,10 @@ setup(
         'console_scripts': [
             'uart_send = pyautoport.uart:uart_send',
             'adb_send = pyautoport.adb:adb_send_via_bash',
+            'adb_tail = pyautoport.adb:adb_tail_via_bash',
             'adb_open = pyautoport.adb:adb_open',
             'adb_reopen = pyautoport.adb:adb_reopen',
-            'adb_close = pyautoport.adb:adb_close',
+            'adb_close = pyautoport.adb:adb_close_via_bash',
             'session_start = pyautoport.teraterm:open_session_start',
             'getenv = pyautoport.teraterm:get_env_via_bash',
             'setenv = pyautoport.teraterm:set_env_via_bash',
@@ -84,6 +85,8 @@ setup(
             'waitln = pyautoport.teraterm:wait_log_via_bash',
             'disconnect = pyautoport.teraterm:disconnect_via_bash',
             'session_stop = pyautoport.teraterm:session_stop',
+            'ttlrun = pyautoport.ttl:run_ttl_via_bash',
+            'pyautoport = pyautoport.cli:main',
         ],
     },
 )
@@ -0,0 +1,52 @@
+"""
+Measure the startup time of every command.
+
+Each command is loaded in a new interpreter, as a console script would, and the
+best time of several runs is reported next to the time of an empty interpreter.
+
+    python tests/benchmark_import_time.py [--runs 10] [--max-ms 100]
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+from pyautoport.cli import COMMANDS
+
+LOAD_COMMAND = 'from pyautoport.cli import get_command; get_command({!r})'
+
+
+def best_time(code, runs):
+    """Returns the best wall time of running code in a new interpreter, in ms"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10, help='Runs per command')
+    parser.add_argument(
+        '--max-ms', type=float,
+        help='Fail if a command takes longer than this on top of an empty interpreter'
+    )
+    args = parser.parse_args()
+
+    baseline = best_time('pass', args.runs)
+    print(f'{"python":<16}{baseline:8.1f} ms')
+    slow = []
+    for name in COMMANDS:
+        elapsed = best_time(LOAD_COMMAND.format(name), args.runs)
+        print(f'{name:<16}{elapsed:8.1f} ms  +{elapsed - baseline:.1f}')
+        if args.max_ms is not None and elapsed - baseline > args.max_ms:
+            slow.append(name)
+    if slow:
+        print(f'Slower than {args.max_ms} ms: {", ".join(slow)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Measure how a pending waitln affects the UART reader.
+
+Lines are written to a pseudo terminal read by a TTYStrategy while read_data
+waits for the last one, and the reader throughput and the CPU time used by the
+whole process are reported. Then a single line is written to the idle terminal
+and the time from writing it to read_data returning is reported. POSIX only.
+
+    python tests/benchmark_waitln.py [--lines 20000] [--runs 3]
+"""
+
+import argparse
+import contextlib
+import os
+import tempfile
+import threading
+import time
+from pyautoport.addon.tty import TTYStrategy
+
+END_LINE = 'benchmark end'
+
+
+def write_lines(master, count, written):
+    """Write count lines then END_LINE, records when it started and when
+    END_LINE was written"""
+    written.append(time.perf_counter())
+    chunk = ''.join(f'line {i} of the benchmark output\r\n' for i in range(100)).encode()
+    for _ in range(count // 100):
+        os.write(master, chunk)
+    os.write(master, f'{END_LINE}\r\n'.encode())
+    written.append(time.perf_counter())
+
+
+def wait_end_line(strategy, master, count):
+    """Returns the time spent in read_data while count lines are written"""
+    written = []
+    # Started once read_data waits
+    writer = threading.Timer(0.05, write_lines, args=(master, count, written))
+    writer.start()
+    found = strategy.read_data(END_LINE, since='now')
+    end = time.perf_counter()
+    writer.join()
+    if not found:
+        raise RuntimeError(f'{END_LINE} not found')
+    return end - written[0], end - written[1]
+
+
+def run_once(count):
+    """Returns (lines per second, CPU seconds, wake up latency in ms)"""
+    master, slave = os.openpty()
+    strategy = TTYStrategy('benchmark')
+    strategy.connect(port=os.ttyname(slave), baudrate=115200)
+    strategy.set_timeout(60)
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, \
+            contextlib.redirect_stdout(devnull):
+        cpu = time.process_time()
+        elapsed, _ = wait_end_line(strategy, master, count)
+        cpu = time.process_time() - cpu
+        _, latency = wait_end_line(strategy, master, 0)
+    strategy.disconnect()
+    os.close(master)
+    os.close(slave)
+    return count / elapsed, cpu, latency * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=20000, help='Lines per run')
+    parser.add_argument('--runs', type=int, default=3, help='Runs, the best one is reported')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        results = [run_once(args.lines) for _ in range(args.runs)]
+    rate, cpu, latency = max(results)
+    print(f'reader throughput {rate:10.0f} lines/s')
+    print(f'process CPU time  {cpu:10.2f} s')
+    print(f'wake up latency   {latency:10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 import pyautoport
 
 pyautoport.adb_open()
-pyautoport.adb_send('ls /')
+print(pyautoport.adb_send('ls /'))
 pyautoport.adb_close()
@@ -0,0 +1,47 @@
+import unittest
+from pyautoport.adb import CommandEnd
+
+
+class TestCommandEnd(unittest.TestCase):
+
+    def marker(self, command_end, status=0):
+        return f'{CommandEnd.PREFIX}{command_end.marker_id}__{status}\r\n'
+
+    def test_marker_split_across_reads(self):
+        command_end = CommandEnd()
+        text = 'total 0\r\n' + self.marker(command_end, 2)
+        output = ''
+        for start in range(0, len(text), 5):
+            output += command_end.feed(text[start:start + 5])
+            self.assertEqual(command_end.done, start + 5 >= len(text))
+        self.assertEqual(output, 'total 0\r\n')
+        self.assertEqual(command_end.exit_status, 2)
+
+    def test_output_after_the_marker_is_not_returned(self):
+        command_end = CommandEnd()
+        self.assertEqual(command_end.feed('ok\n' + self.marker(command_end) + 'later\n'), 'ok\n')
+        self.assertEqual(command_end.flush(), '')
+
+    def test_stale_marker_is_removed(self):
+        stale, command_end = CommandEnd(), CommandEnd()
+        output = command_end.feed('late\n' + self.marker(stale, 1) + 'now\n')
+        self.assertEqual(output, 'late\nnow\n')
+        self.assertFalse(command_end.done)
+        self.assertIsNone(command_end.exit_status)
+
+    def test_prefix_is_held_back(self):
+        command_end = CommandEnd()
+        self.assertEqual(command_end.feed('abc__PYAUTO'), 'abc')
+        self.assertEqual(command_end.feed('PORT_END_0123'), '')
+        self.assertEqual(command_end.flush(), '__PYAUTOPORT_END_0123')
+
+    def test_text_that_cannot_be_a_marker_is_not_held_back(self):
+        command_end = CommandEnd()
+        self.assertEqual(command_end.feed('grep __PYAUTOPORT_END_ log\n'),
+                         'grep __PYAUTOPORT_END_ log\n')
+        self.assertEqual(command_end.feed(self.marker(command_end)[:-6]), '')
+        self.assertEqual(command_end.feed('x\n'), self.marker(command_end)[:-6] + 'x\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
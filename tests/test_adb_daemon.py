@@ -0,0 +1,190 @@
+import asyncio
+import os
+import socket
+import stat
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+import pyautoport.adb as adb
+import pyautoport.protocol as protocol
+import pyautoport.transport as transport
+
+# adb -s SERIAL shell, the shell knows its serial
+FAKE_ADB = '''#!/bin/sh
+if [ "$1" = -s ]; then SERIAL=$2; export SERIAL; fi
+exec sh
+'''
+
+
+@unittest.skipUnless(os.name == 'posix', 'the fake adb is a shell script')
+class TestAdbDaemon(unittest.TestCase):
+    """Daemon serving a fake adb running sh, in a thread of the test"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        fake_adb = os.path.join(self.directory, 'adb')
+        with open(fake_adb, 'w', encoding='utf-8') as f:
+            f.write(FAKE_ADB)
+        os.chmod(fake_adb, stat.S_IRWXU)
+        for patcher in (
+            mock.patch.dict(os.environ, {
+                'XDG_RUNTIME_DIR': self.directory, 'TESTER_DAEMON_SOCKET': 'unix',
+                'PATH': f'{self.directory}{os.pathsep}{os.environ["PATH"]}',
+            }),
+            mock.patch.object(adb, 'PID_FILE', os.path.join(self.directory, 'adb.pid')),
+            mock.patch('sys.stdout'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.thread = threading.Thread(target=asyncio.run, args=(adb.serve_adb_daemon(''),))
+        self.thread.start()
+        self.addCleanup(self.stop)
+        deadline = time.monotonic() + 5
+        while not os.path.exists(transport.socket_path('adb')):
+            self.assertLess(time.monotonic(), deadline, 'daemon did not start')
+            time.sleep(0.01)
+
+    def stop(self):
+        adb.adb_close()
+        self.thread.join(10)
+
+    def send_in_thread(self, *args, **kwargs):
+        """Returns the thread running adb_send and the list its result is added to"""
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(adb.adb_send(*args, with_status=True, **kwargs))
+        )
+        thread.start()
+        return thread, results
+
+    def test_timeout_starts_once_the_command_runs(self):
+        slow, results = self.send_in_thread('sleep 2; echo slow', 5)
+        time.sleep(0.3)
+        self.assertEqual(adb.adb_send('echo fast', 0.5, with_status=True), ('fast\n', 0))
+        slow.join()
+        self.assertEqual(results, [('slow\n', 0)])
+
+    def test_command_of_a_client_gone_while_waiting_is_not_run(self):
+        flag = os.path.join(self.directory, 'flag')
+        slow, _ = self.send_in_thread('sleep 1', 3)
+        time.sleep(0.3)
+        with transport.connect('adb', adb.PORT_ABD_WRITE) as client_socket:
+            client_socket.sendall(protocol.encode_fields(
+                protocol.REQUEST, 1, command='send', text=f'touch {flag}', timeout=1
+            ))
+        slow.join()
+        self.assertEqual(adb.adb_send(f'test -e {flag}', with_status=True), ('', 1))
+
+    def test_each_serial_has_its_shell(self):
+        self.assertEqual(adb.adb_send('echo $SERIAL', serial='a'), 'a\n')
+        self.assertEqual(adb.adb_send('echo $SERIAL', serial='b'), 'b\n')
+        self.assertEqual(adb.adb_send('echo $SERIAL'), '\n')
+
+    def test_serials_do_not_wait_for_each_other(self):
+        slow, results = self.send_in_thread('sleep 1; echo slow', 3, serial='a')
+        time.sleep(0.3)
+        start = time.monotonic()
+        self.assertEqual(adb.adb_send('echo fast', serial='b'), 'fast\n')
+        self.assertLess(time.monotonic() - start, 0.5)
+        slow.join()
+        self.assertEqual(results, [('slow\n', 0)])
+
+    def test_tail_does_not_block_senders(self):
+        outputs = []
+        tail = threading.Thread(target=lambda: outputs.extend(adb.adb_tail(1, 'a')))
+        tail.start()
+        time.sleep(0.3)
+        start = time.monotonic()
+        self.assertEqual(adb.adb_send('echo hello', serial='a'), 'hello\n')
+        self.assertLess(time.monotonic() - start, 0.5)
+        tail.join()
+        self.assertIn('hello\n', ''.join(outputs))
+
+    def test_exit_with_a_serial_only_closes_its_shell(self):
+        adb.adb_send('X=a', serial='a')
+        adb.adb_send('X=b', serial='b')
+        adb.adb_close('a')
+        self.assertEqual(adb.adb_send('echo ${X:-unset}', serial='a'), 'unset\n')
+        self.assertEqual(adb.adb_send('echo ${X:-unset}', serial='b'), 'b\n')
+
+    def test_adb_send_async_to_several_serials(self):
+        async def send_all():
+            return await asyncio.gather(*(
+                adb.adb_send_async('sleep 0.5; echo $SERIAL', 2, serial=serial)
+                for serial in 'abc'
+            ))
+        start = time.monotonic()
+        self.assertEqual(asyncio.run(send_all()), ['a\n', 'b\n', 'c\n'])
+        self.assertLess(time.monotonic() - start, 1.4)
+
+    def test_exit_status_of_adb_send(self):
+        for argv, status in (
+            (['adb_send', 'false'], 1),
+            (['adb_send', '-t', '0.3', 'sleep 2; true'], adb.EXIT_STATUS_TIMEOUT),
+            (['adb_send', '--no-wait-exit', '-t', '0.3', 'true'], None),
+        ):
+            with mock.patch('sys.argv', argv):
+                try:
+                    adb.adb_send_via_bash()
+                    code = None
+                except SystemExit as e:
+                    code = e.code
+            self.assertEqual(code, status, argv)
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'Unix domain sockets are not available')
+class TestAdbResponse(unittest.TestCase):
+    """Responses of a fake daemon that never ends them"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.dict(os.environ, {
+            'XDG_RUNTIME_DIR': directory.name, 'TESTER_DAEMON_SOCKET': 'unix',
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server_socket = transport.create_server_socket('adb', 0)
+        self.addCleanup(transport.close_server_socket, self.server_socket)
+
+    def serve(self, close):
+        """Answer one request with START and some output, then close or stall"""
+        def run():
+            client_socket, _ = self.server_socket.accept()
+            with client_socket:
+                protocol.recv_frame(client_socket)
+                client_socket.sendall(protocol.encode_frame(protocol.START, 1))
+                client_socket.sendall(protocol.encode_frame(protocol.DATA, 1, b'partial\n'))
+                if not close:
+                    # Until the client gives up
+                    protocol.recv_frame(client_socket)
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_lost_response_raises(self):
+        self.serve(close=True)
+        response = adb.send_request('ls', 0.1)
+        with self.assertRaises(ConnectionResetError):
+            list(response)
+
+    def test_stalled_response_raises(self):
+        self.serve(close=False)
+        outputs = []
+        with self.assertRaises(TimeoutError):
+            for output in adb.send_request('ls', 0.1):
+                outputs.append(output)
+        self.assertEqual(outputs, ['partial\n'])
+
+    def test_stalled_response_raises_async(self):
+        self.serve(close=False)
+        with self.assertRaises(TimeoutError):
+            asyncio.run(adb.adb_send_async('ls', 0.1))
+
+
+if __name__ == '__main__':
+    unittest.main()
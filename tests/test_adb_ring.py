@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+from pyautoport.adb import OutputRing
+
+
+class TestOutputRing(unittest.TestCase):
+
+    def test_cursor_reads_only_new_output(self):
+        async def scenario():
+            ring = OutputRing(16)
+            await ring.append(b'stale\n')
+            cursor = ring.end
+            await ring.append(b'fresh\n')
+            return ring.read(cursor)
+
+        self.assertEqual(asyncio.run(scenario()), (b'fresh\n', 12, 0))
+
+    def test_overflow_drops_oldest_and_counts(self):
+        async def scenario():
+            ring = OutputRing(8)
+            await ring.append(b'0123456789abcdef')
+            return ring.read(0), ring.start, ring.overflows
+
+        (output, cursor, skipped), start, overflows = asyncio.run(scenario())
+        self.assertEqual(output, b'89abcdef')
+        self.assertEqual((cursor, skipped, start, overflows), (16, 8, 8, 1))
+
+    def test_wait_times_out_and_wakes_up(self):
+        async def close_later(ring):
+            await asyncio.sleep(0.05)
+            await ring.close()
+
+        async def scenario():
+            ring = OutputRing(8)
+            timed_out = not await ring.wait(0, 0.05)
+            task = asyncio.ensure_future(close_later(ring))
+            woken = await ring.wait(0, 1)
+            await task
+            return timed_out, woken
+
+        self.assertEqual(asyncio.run(scenario()), (True, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
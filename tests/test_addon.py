@@ -0,0 +1,175 @@
+import threading
+import unittest
+from unittest import mock
+from pyautoport.addon.adb import ADBStrategy
+from pyautoport.addon.addon import AddonStrategy
+from pyautoport.addon.tty import TTYStrategy
+
+
+class FakeStrategy(AddonStrategy):
+    """Connection whose output is given by the test through match_line"""
+
+    def __init__(self):
+        super().__init__('fake')
+        self.running = True
+        self.timeout = 0.2
+
+    def set_timeout(self, timeout):
+        self.timeout = timeout
+
+    def set_log(self, log_file, save_flag):
+        pass
+
+    def connect(self):
+        pass
+
+    def send_data(self, data):
+        self.mark_sent()
+
+    def send_data_to_log(self, data):
+        pass
+
+    def disconnect(self):
+        self.running = False
+        self.wake_waiters()
+
+
+class TestHistory(unittest.TestCase):
+
+    def test_output_received_after_send_is_found(self):
+        strategy = FakeStrategy()
+        strategy.match_line('old prompt\n')
+        strategy.send_data('reboot')
+        strategy.match_line('Booting\n')
+        self.assertEqual(strategy.read_data('Booting').line, 'Booting')
+        self.assertIsNone(strategy.read_data('old prompt'))
+
+    def test_cursor_moves_after_match(self):
+        strategy = FakeStrategy()
+        strategy.send_data('ls')
+        strategy.match_line('a\n')
+        strategy.match_line('b\n')
+        strategy.match_line('a\n')
+        self.assertEqual(strategy.read_data(['a', 'b']).index, 0)
+        self.assertEqual(strategy.read_data(['a', 'b']).index, 1)
+        self.assertEqual(strategy.read_data(['a', 'b']).index, 0)
+        self.assertIsNone(strategy.read_data(['a', 'b']))
+
+    def test_since_now_and_seconds(self):
+        strategy = FakeStrategy()
+        strategy.match_line('ready\n')
+        self.assertIsNone(strategy.read_data('ready', since='now'))
+        self.assertIsNotNone(strategy.read_data('ready', since='5'))
+        with self.assertRaises(ValueError):
+            strategy.read_data('ready', since='later')
+
+    def test_waits_for_new_output(self):
+        strategy = FakeStrategy()
+        strategy.set_timeout(5)
+        strategy.send_data('ls')
+        timer = threading.Timer(0.05, strategy.match_line, args=('done\n',))
+        timer.start()
+        self.assertEqual(strategy.read_data('done').line, 'done')
+        timer.join()
+
+    def test_history_is_bounded(self):
+        strategy = FakeStrategy()
+        for number in range(strategy.history.maxlen + 10):
+            strategy.match_line(f'line {number}.\n')
+        self.assertEqual(len(strategy.history), strategy.history.maxlen)
+        self.assertEqual(strategy.history[0][2], 'line 10.\n')
+        self.assertIsNone(strategy.read_data('line 9.'))
+        self.assertIsNotNone(strategy.read_data('line 10.'))
+
+    def test_disconnect_ends_wait(self):
+        strategy = FakeStrategy()
+        strategy.set_timeout(5)
+        timer = threading.Timer(0.05, strategy.disconnect)
+        timer.start()
+        self.assertIsNone(strategy.read_data('never'))
+        timer.join()
+
+
+class FakeStdin:
+    """stdin of adb shell, records what is written"""
+
+    def __init__(self, exited=False):
+        self.exited = exited
+        self.writes = []
+
+    def write(self, data):
+        if self.exited:
+            raise BrokenPipeError('adb shell exited')
+        self.writes.append(data)
+
+    def flush(self):
+        pass
+
+
+class TestADBWriter(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('sys.stdout')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.strategy = ADBStrategy('fake')
+        self.strategy.running = True
+        self.strategy.adb_event.set()
+        self.port = mock.Mock(stdin=FakeStdin())
+
+    def test_queued_commands_are_written_at_once(self):
+        for command in ('cd /data', 'ls', 'pwd'):
+            self.strategy.send_data(command)
+        self.strategy.data.put(None)
+        self.strategy._write(self.port)
+        self.assertEqual(self.port.stdin.writes, [b'cd /data\nls\npwd\n'])
+
+    def test_commands_after_the_stop_are_not_written(self):
+        self.strategy.send_data('ls')
+        self.strategy.data.put(None)
+        self.strategy.send_data('reboot')
+        self.strategy._write(self.port)
+        self.assertEqual(self.port.stdin.writes, [b'ls\n'])
+
+    def test_stop_ends_the_writer(self):
+        thread = threading.Thread(target=self.strategy._write, args=(self.port,))
+        thread.start()
+        self.strategy.thread = thread
+        self.strategy.send_data('ls')
+        self.strategy._stop_thread()
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(self.strategy.running)
+        self.assertEqual(b''.join(self.port.stdin.writes), b'ls\n')
+
+    def test_writer_stops_once_adb_exited(self):
+        self.port.stdin.exited = True
+        self.strategy.send_data('ls')
+        self.strategy._write(self.port)
+        self.assertFalse(self.strategy.running)
+
+    def test_nothing_is_queued_before_connect(self):
+        self.strategy.adb_event.clear()
+        self.strategy.send_data('ls')
+        self.assertTrue(self.strategy.data.empty())
+
+
+class TestTTYSend(unittest.TestCase):
+
+    @mock.patch('time.sleep')
+    def test_send_does_not_wait(self, sleep):
+        strategy = TTYStrategy('fake')
+        strategy.port = mock.Mock(is_open=True)
+        strategy.running = True
+        strategy.timeout = 0.1
+        strategy.match_line('old prompt\n')
+        strategy.send_data('ls')
+        # The answer is found from the history, even if it arrives at once
+        strategy.match_line('bin\n')
+        sleep.assert_not_called()
+        self.assertEqual(strategy.port.write.call_args_list, [mock.call(b'ls'), mock.call(b'\n')])
+        self.assertEqual(strategy.read_data('bin').line, 'bin')
+        self.assertIsNone(strategy.read_data('old prompt'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import ast
+import importlib
+import inspect
+import subprocess
+import sys
+import types
+import unittest
+from unittest import mock
+import pyautoport
+from pyautoport import cli
+
+
+def imported_modules(code):
+    """Returns the modules imported by code in a new interpreter"""
+    output = subprocess.run(
+        [sys.executable, '-c', f'{code}; import sys; print(" ".join(sys.modules))'],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return set(output.split())
+
+
+def imported_names(module):
+    """Returns the names bound by the imports at the top level of module"""
+    names = set()
+    nodes = list(ast.parse(inspect.getsource(module)).body)
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update(alias.asname or alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, (ast.If, ast.Try, ast.ExceptHandler)):
+            nodes.extend(ast.iter_child_nodes(node))
+    return names
+
+
+class TestCli(unittest.TestCase):
+
+    def test_package_import_is_lazy(self):
+        modules = imported_modules('import pyautoport')
+        self.assertNotIn('pyautoport.adb', modules)
+        self.assertNotIn('serial', modules)
+
+    def test_teraterm_commands_do_not_load_connections(self):
+        modules = imported_modules("from pyautoport.cli import get_command; get_command('send')")
+        self.assertIn('pyautoport.teraterm', modules)
+        for module in ('serial', 'asyncio', 'pyautoport.session', 'pyautoport.adb'):
+            self.assertNotIn(module, modules)
+
+    def test_public_functions_resolve(self):
+        from pyautoport.adb import adb_send
+        self.assertIs(pyautoport.adb_send, adb_send)
+        self.assertIn('uart_send', dir(pyautoport))
+        with self.assertRaises(AttributeError):
+            pyautoport.no_such_function
+
+    def test_names_of_the_former_star_imports_resolve(self):
+        for module_name in pyautoport._MODULE_ATTRIBUTES:
+            module = importlib.import_module(f'pyautoport.{module_name}')
+            imported = imported_names(module)
+            for name, value in vars(module).items():
+                if name.startswith('_') or isinstance(value, types.ModuleType) or name in imported:
+                    continue
+                self.assertIn(name, pyautoport.__all__, module_name)
+                # Such as PID_FILE, from the last star-import as before
+                if pyautoport._ATTRIBUTE_MODULES[name] == module_name:
+                    self.assertIs(getattr(pyautoport, name), value, name)
+        self.assertIs(pyautoport.open_conn, pyautoport.teraterm.open_conn)
+
+    def test_all_commands_exist(self):
+        for name in cli.COMMANDS:
+            self.assertTrue(callable(cli.get_command(name)), name)
+
+    @mock.patch('pyautoport.cli.get_command')
+    def test_command_from_argument_or_link_name(self, get_command):
+        with mock.patch.object(sys, 'argv', sys.argv[:]):
+            cli.main(['/usr/bin/pyautoport', 'send', 'ls', '/'])
+            self.assertEqual(sys.argv, ['send', 'ls', '/'])
+            cli.main(['/usr/local/bin/waitln.exe', 'login:'])
+            self.assertEqual(sys.argv, ['waitln', 'login:'])
+        self.assertEqual(get_command.call_args_list, [mock.call('send'), mock.call('waitln')])
+        self.assertEqual(cli.main(['pyautoport', 'no_such_command']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
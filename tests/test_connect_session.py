@@ -0,0 +1,108 @@
+import unittest
+from unittest import mock
+from pyautoport.session import ADBStrategy, ConnectSession, TTYStrategy
+
+
+class FakeTTY(TTYStrategy):
+    """UART connection without a serial port"""
+
+    def connect(self, port='/dev/ttyACM0', baudrate=125000):
+        self.port = mock.Mock(port=port, baudrate=baudrate, is_open=True)
+        self.running = True
+
+    def disconnect(self):
+        self.running = False
+
+
+class FakeADB(ADBStrategy):
+    """ADB connection without adb"""
+
+    def connect(self, serial_port=''):
+        self.serial_port = serial_port
+        self.running = True
+
+    def disconnect(self):
+        self.running = False
+
+
+class TestConnectSession(unittest.TestCase):
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.object(ConnectSession, '_instance', None),
+            mock.patch.object(ConnectSession, 'strategies', {'tty': FakeTTY, 'adb': FakeADB}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.session = ConnectSession()
+
+    def test_the_session_keeps_its_connections(self):
+        self.session.connect('adb', 'dut', serial_port='1234')
+        session = ConnectSession()
+        self.assertIs(session, self.session)
+        self.assertEqual(session.current, 'dut')
+        self.assertTrue(session.connect_check('dut'))
+
+    def test_connect_names_the_connections(self):
+        self.session.connect('tty', port='/dev/ttyUSB0', baudrate=115200)
+        self.session.connect('adb', 'dut', serial_port='1234')
+        self.assertEqual(list(self.session.connections), ['tty', 'dut'])
+        self.assertEqual(self.session.current, 'dut')
+        self.assertEqual(self.session.type, 'adb')
+        self.assertEqual(self.session.get_type('tty'), 'tty')
+        self.assertEqual(self.session.get('tty').port.port, '/dev/ttyUSB0')
+        with self.assertRaises(ValueError):
+            self.session.connect('telnet')
+        with self.assertRaises(ValueError):
+            self.session.get('main')
+
+    def test_connect_switches_to_a_running_connection(self):
+        self.session.connect('adb', 'a', serial_port='1')
+        strategy = self.session.get()
+        self.session.connect('adb', 'b', serial_port='2')
+        self.session.connect('adb', 'a', serial_port='3')
+        self.assertEqual(self.session.current, 'a')
+        self.assertIs(self.session.get(), strategy)
+        self.assertEqual(strategy.serial_port, '1')
+        with self.assertRaises(ValueError):
+            self.session.connect('tty', 'a')
+
+    def test_connect_reopens_a_stopped_connection(self):
+        self.session.connect('adb', 'a', serial_port='1')
+        self.session.get().running = False
+        self.assertFalse(self.session.connect_check())
+        self.session.connect('adb', 'a', serial_port='2')
+        self.assertTrue(self.session.connect_check())
+        self.assertEqual(self.session.get().serial_port, '2')
+
+    def test_disconnect_by_name_type_or_all(self):
+        self.session.connect('tty', 'main')
+        self.session.connect('adb', 'a')
+        self.session.connect('adb', 'b')
+        strategy = self.session.get('b')
+        self.session.disconnect('adb')
+        self.assertFalse(strategy.running)
+        self.assertEqual(list(self.session.connections), ['main'])
+        self.assertEqual(self.session.current, 'main')
+        with self.assertRaises(ValueError):
+            self.session.disconnect('a')
+        self.session.connect('adb', 'a')
+        self.session.disconnect('main')
+        self.assertEqual(self.session.current, 'a')
+        self.session.disconnect('all')
+        self.assertEqual(self.session.connections, {})
+        self.assertIsNone(self.session.current)
+        self.assertIsNone(self.session.type)
+
+    def test_a_uart_port_is_read_by_one_connection(self):
+        self.session.connect('tty', 'main', port='/dev/ttyUSB0')
+        with self.assertRaises(ValueError):
+            self.session.connect('tty', 'other', port='/dev/ttyUSB0')
+        self.assertNotIn('other', self.session.connections)
+        self.assertEqual(self.session.current, 'main')
+        self.session.connect('tty', 'other', port='/dev/ttyUSB1')
+        self.assertEqual(list(self.session.connections), ['main', 'other'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import contextlib
+import gzip
+import io
+import lzma
+import os
+import tempfile
+import time
+import unittest
+from pyautoport.addon import logwriter
+from pyautoport.addon.logwriter import (
+    LogWriter, check_log_options, parse_size, write_log_header
+)
+
+
+class TestLogWriter(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'test.log')
+
+    def read(self, path=None):
+        with open(path or self.path, encoding='utf-8') as f:
+            return f.read()
+
+    def write_rotated(self, lines, **options):
+        """Writes lines one batch at a time, returns the rotated logs"""
+        log = LogWriter(self.path, **options)
+        with log:
+            for line in lines:
+                log.write(line)
+                log.flush()
+        if log.rotator.thread:
+            log.rotator.thread.join()
+        return sorted(
+            name for name in os.listdir(os.path.dirname(self.path)) if name != 'test.log'
+        )
+
+    def test_lines_are_written_in_order(self):
+        with LogWriter(self.path) as log:
+            for number in range(1000):
+                log.write(f'line {number}\r\n')
+        self.assertEqual(self.read(), ''.join(f'line {number}\n' for number in range(1000)))
+
+    def test_line_policy_flushes_without_waiting(self):
+        with LogWriter(self.path) as log:
+            log.write('booted\r\n')
+            deadline = time.monotonic() + 5
+            while self.read() != 'booted\n' and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(self.read(), 'booted\n')
+
+    def test_wait_policy_flushes_on_request(self):
+        with LogWriter(self.path, flush='wait') as log:
+            log.write('booted\n')
+            time.sleep(0.05)
+            self.assertEqual(self.read(), '')
+            log.flush()
+            self.assertEqual(self.read(), 'booted\n')
+
+    def test_interval_policy(self):
+        with LogWriter(self.path, flush='interval', interval=0.1) as log:
+            log.write('booted\n')
+            time.sleep(0.3)
+            self.assertEqual(self.read(), 'booted\n')
+
+    def test_full_queue_drops_and_reports(self):
+        original = logwriter.LOG_QUEUE_LINES
+        logwriter.LOG_QUEUE_LINES = 2
+        try:
+            log = LogWriter(self.path)
+        finally:
+            logwriter.LOG_QUEUE_LINES = original
+        # Nothing is written before start, so the queue fills up
+        for number in range(5):
+            log.write(f'line {number}\n')
+        self.assertEqual(log.dropped, 3)
+        log.start()
+        log.flush()
+        log.write('line 5\n')
+        log.close()
+        self.assertEqual(self.read(), 'line 0\nline 1\n>>>>>>>>>> 3 lines dropped\nline 5\n')
+
+    def test_fsync(self):
+        with LogWriter(self.path, fsync=True) as log:
+            log.write('synced\n')
+        self.assertEqual(self.read(), 'synced\n')
+
+    @unittest.skipUnless(os.path.exists('/dev/full'), 'needs /dev/full')
+    def test_write_errors_are_reported_once(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            with LogWriter('/dev/full', flush='wait', fsync=True) as log:
+                for number in range(logwriter.LOG_QUEUE_LINES * 2):
+                    log.write(f'line {number}\n', block=True)
+                    if number % 1000 == 0:
+                        log.flush()
+                log.flush()
+        self.assertEqual(log.error.errno, 28)
+        self.assertEqual(output.getvalue().count('Warning'), 1)
+
+    def test_stopped_writer_does_not_block(self):
+        log = LogWriter(self.path)
+        log.start()
+        log.queue.put(None)
+        log.thread.join()
+        for number in range(logwriter.LOG_QUEUE_LINES + 1):
+            log.write(f'line {number}\n', block=True)
+        log.flush()
+        self.assertEqual(log.dropped, 1)
+
+    def test_rotate_by_size_and_compress(self):
+        lines = [f'{number:49}\n' for number in range(10)]
+        self.assertEqual(
+            self.write_rotated(lines, rotate_size=100, compress='gzip'),
+            ['test.log.1.gz', 'test.log.2.gz', 'test.log.3.gz', 'test.log.4.gz']
+        )
+        with gzip.open(self.path + '.2.gz', 'rt', encoding='utf-8') as f:
+            self.assertEqual(f.read(), lines[2] + lines[3])
+        self.assertEqual(self.read(), lines[8] + lines[9])
+
+    def test_rotate_keeps_the_last_logs(self):
+        lines = [f'{number:49}\n' for number in range(10)]
+        self.assertEqual(
+            self.write_rotated(lines, rotate_size='100', compress='lzma', keep=2),
+            ['test.log.3.xz', 'test.log.4.xz']
+        )
+        with lzma.open(self.path + '.4.xz', 'rt', encoding='utf-8') as f:
+            self.assertEqual(f.read(), lines[6] + lines[7])
+
+    def test_rotate_by_time_after_existing_logs(self):
+        with open(self.path + '.7', 'w', encoding='utf-8') as f:
+            f.write('older\n')
+        log = LogWriter(self.path, rotate_interval=0.05)
+        with log:
+            log.write('first\n')
+            log.flush()
+            time.sleep(0.1)
+            log.write('second\n')
+        self.assertEqual(self.read(self.path + '.8'), 'first\n')
+        self.assertEqual(self.read(), 'second\n')
+
+    def test_header_truncates_unless_rotated(self):
+        write_log_header(self.path, 'one\n', check_log_options())
+        write_log_header(self.path, 'two\n', check_log_options())
+        self.assertEqual(self.read(), 'two\n')
+        write_log_header(self.path, 'three\n', check_log_options(rotate_size='1M'))
+        self.assertEqual(self.read(), 'two\nthree\n')
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size(100), 100)
+        self.assertEqual(parse_size('512K'), 512 << 10)
+        self.assertEqual(parse_size('2gb'), 2 << 30)
+        with self.assertRaises(ValueError):
+            parse_size('lots')
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            check_log_options(flush='never')
+        with self.assertRaises(ValueError):
+            check_log_options(interval=0)
+        with self.assertRaises(ValueError):
+            check_log_options(rotate=True)
+        with self.assertRaises(ValueError):
+            check_log_options(compress='zip')
+        with self.assertRaises(ValueError):
+            check_log_options(keep=-1)
+
+
+if __name__ == '__main__':
+    unittest.main()
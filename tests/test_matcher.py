@@ -0,0 +1,77 @@
+import re
+import unittest
+from pyautoport.addon.matcher import AhoCorasick, Matcher
+
+
+class TestAhoCorasick(unittest.TestCase):
+
+    def test_first_word_ending(self):
+        automaton = AhoCorasick(['he', 'she', 'his', 'hers'])
+        # she and he end together, he comes first
+        self.assertEqual(automaton.search('ushers')[1], (4, 0))
+        self.assertEqual(automaton.search('xyz')[1], None)
+
+    def test_state_carries_over_parts(self):
+        automaton = AhoCorasick(['abcd', 'bce'])
+        state, found = automaton.search('xab')
+        self.assertIsNone(found)
+        self.assertEqual(automaton.search('cd', state)[1], (2, 0))
+
+    def test_suffix_word_found_through_fail_links(self):
+        automaton = AhoCorasick(['abcx', 'bc'])
+        self.assertEqual(automaton.search('abcy')[1], (3, 1))
+
+
+class TestMatcher(unittest.TestCase):
+
+    def test_first_pattern_received_wins(self):
+        matcher = Matcher(['login:', 'Kernel panic', 'ERROR'])
+        self.assertIsNone(matcher.feed('Booting\r\n'))
+        match = matcher.feed('ERROR: disk\r\nlogin: ')
+        self.assertEqual((match.index, match.pattern, match.line), (2, 'ERROR', 'ERROR: disk'))
+
+    def test_earliest_end_in_line(self):
+        matcher = Matcher(['panic', re.compile(r'Kern\w+')])
+        self.assertEqual(matcher.feed('Kernel panic\n').index, 1)
+
+    def test_partial_lines(self):
+        for patterns in (['Kernel panic'], ['x', 'Kernel panic'], [re.compile('Kernel panic')]):
+            matcher = Matcher(patterns)
+            self.assertIsNone(matcher.feed('[ 1.0] Kern'))
+            self.assertIsNone(matcher.feed('el pa'))
+            match = matcher.feed('nic - not syncing\r\n')
+            self.assertEqual(match.index, len(patterns) - 1)
+            self.assertEqual(match.line, '[ 1.0] Kernel panic - not syncing')
+
+    def test_lines_do_not_join(self):
+        matcher = Matcher([re.compile('a.*b'), 'ab'])
+        self.assertIsNone(matcher.feed('a\nb\n'))
+
+    def test_regex_groups_from_alternation(self):
+        matcher = Matcher([
+            'never', re.compile(r'IP=(\d+)\.(\d+)'), re.compile(r'link (up|down)'),
+        ])
+        self.assertIsNotNone(matcher.alternation)
+        match = matcher.feed('eth0 link up, IP=10.2\n')
+        self.assertEqual((match.index, match.groups), (2, ('up',)))
+        match = matcher.feed('IP=10.3\n')
+        self.assertEqual((match.index, match.pattern, match.groups), (1, r'IP=(\d+)\.(\d+)', ('10', '3')))
+
+    def test_regexes_with_backreferences_are_not_combined(self):
+        matcher = Matcher([re.compile(r'(\w)\1'), re.compile(r'(?P<n>x)')])
+        self.assertIsNone(matcher.alternation)
+        self.assertEqual(matcher.feed('abba\n').groups, ('b',))
+
+    def test_regexes_with_inline_flags_are_not_combined(self):
+        matcher = Matcher([re.compile('(?i)error'), re.compile('(?i)panic')])
+        self.assertIsNone(matcher.alternation)
+        self.assertEqual(matcher.feed('Kernel PANIC\n').index, 1)
+
+    def test_regexes_with_the_same_group_names_are_searched_one_by_one(self):
+        matcher = Matcher([re.compile('(?P<word>a+)'), re.compile('(?P<word>b+)')])
+        self.assertIsNone(matcher.alternation)
+        self.assertEqual(matcher.feed('bb\n').groups, ('bb',))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import asyncio
+import errno
+import os
+import socket
+import tempfile
+import unittest
+from unittest import mock
+import pyautoport.protocol as protocol
+import pyautoport.transport as transport
+
+
+class TestProtocol(unittest.TestCase):
+
+    def test_frame_round_trip_over_socket(self):
+        left, right = socket.socketpair()
+        with left, right:
+            text = 'cat <<EOF\n' + 'x' * 5000 + '\nEOF'
+            left.sendall(protocol.encode_fields(protocol.REQUEST, 7, text=text, timeout=1.5))
+            left.sendall(protocol.encode_frame(protocol.DATA, 7, b'\x00\xff'))
+            left.sendall(protocol.encode_fields(protocol.END, 7, exit_status=0))
+            left.close()
+
+            kind, request_id, payload = protocol.recv_frame(right)
+            self.assertEqual((kind, request_id), (protocol.REQUEST, 7))
+            self.assertEqual(protocol.decode_fields(payload), {'text': text, 'timeout': 1.5})
+            self.assertEqual(protocol.recv_frame(right), (protocol.DATA, 7, b'\x00\xff'))
+            kind, _, payload = protocol.recv_frame(right)
+            self.assertEqual(kind, protocol.END)
+            self.assertEqual(protocol.decode_fields(payload), {'exit_status': 0})
+            self.assertIsNone(protocol.recv_frame(right))
+
+    def test_read_frame_from_asyncio_stream(self):
+        async def read_all(data):
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            frames = []
+            while True:
+                frame = await protocol.read_frame(reader)
+                if frame is None:
+                    return frames
+                frames.append(frame)
+
+        data = protocol.encode_frame(protocol.DATA, 1, b'abc') + protocol.encode_frame(protocol.END, 1)
+        self.assertEqual(asyncio.run(read_all(data)),
+                         [(protocol.DATA, 1, b'abc'), (protocol.END, 1, b'')])
+        with self.assertRaises(protocol.ProtocolError):
+            asyncio.run(read_all(data[:-3]))
+
+    def test_invalid_frames(self):
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode_header(b'XX' + protocol.encode_frame(protocol.DATA, 1)[2:])
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode_header(protocol.HEADER.pack(protocol.MAGIC, 99, protocol.DATA, 1, 0))
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode_fields(b'[1, 2]')
+
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'Unix domain sockets are not available')
+class TestTransport(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.dict(os.environ, {
+            'XDG_RUNTIME_DIR': directory.name, 'TESTER_DAEMON_SOCKET': 'unix',
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stale_socket_file_is_replaced(self):
+        transport.create_server_socket('test', 0).close()
+        self.assertTrue(os.path.exists(transport.socket_path('test')))
+        server_socket = transport.create_server_socket('test', 0)
+        with transport.connect('test', 0) as client_socket:
+            client_socket.sendall(b'x')
+        transport.close_server_socket(server_socket)
+        self.assertFalse(os.path.exists(transport.socket_path('test')))
+
+    def test_socket_of_running_daemon_is_kept(self):
+        server_socket = transport.create_server_socket('test', 0)
+        with self.assertRaises(OSError) as context:
+            transport.create_server_socket('test', 0)
+        self.assertEqual(context.exception.errno, errno.EADDRINUSE)
+        with transport.connect('test', 0) as client_socket:
+            self.assertEqual(client_socket.getpeername(), transport.socket_path('test'))
+        transport.close_server_socket(server_socket)
+
+    @unittest.skipUnless(hasattr(os, 'getuid'), 'needs POSIX permissions')
+    def test_runtime_dir_must_be_private(self):
+        path = os.path.join(os.environ['XDG_RUNTIME_DIR'], 'shared')
+        transport.make_private_dir(path)
+        os.chmod(path, 0o777)
+        with self.assertRaises(PermissionError):
+            transport.make_private_dir(path)
+        link = os.path.join(os.environ['XDG_RUNTIME_DIR'], 'link')
+        os.symlink(os.environ['XDG_RUNTIME_DIR'], link)
+        with self.assertRaises(PermissionError):
+            transport.make_private_dir(link)
+
+    @unittest.skipUnless(hasattr(socket, 'SO_PEERCRED'), 'needs SO_PEERCRED')
+    def test_clients_of_other_users_are_told(self):
+        left, right = socket.socketpair()
+        with left, right:
+            self.assertTrue(transport.peer_is_same_user(right))
+            with mock.patch('os.getuid', return_value=os.getuid() + 1):
+                self.assertFalse(transport.peer_is_same_user(right))
+
+
+if __name__ == '__main__':
+    unittest.main()
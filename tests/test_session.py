@@ -2,21 +2,18 @@
 Test for TeraTerm Mode
 """
 
-import time
 import pyautoport
 
 pyautoport.open_session_start()
 
-pyautoport.open_conn('adb')
-pyautoport.send('ls')
-pyautoport.send('pwd')
-pyautoport.close_conn('adb')
-time.sleep(1)
-
-pyautoport.open_conn('tty')
-pyautoport.send('ls')
-pyautoport.send('pwd')
-pyautoport.close_conn('tty')
-time.sleep(1)
+with pyautoport.SessionClient() as client:
+    # UART console and ADB shell at the same time
+    print(client.request('connect', 'tty', 'main'))
+    print(client.request('connect', 'adb', 'dut'))
+    print(client.request('send', 'ls', 'dut'))
+    print(client.request('send', 'ls', 'main'))
+    print(client.request('send', 'pwd'))
+    print(client.request('disconnect', 'dut'))
+    print(client.request('disconnect', 'all'))
 
 pyautoport.session_stop()
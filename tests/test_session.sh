@@ -59,6 +59,17 @@ echo "### CONFIRM saving log file exists ###"
 sleep 1
 ls -al test.log
 
+sleep 1
+echo "[Testing named sessions]"
+connect uart main
+connect adb dut
+send --to dut 'ls'
+send --to main 'ls'
+echo "### CONFIRM ls was sent to both adb and uart ###"
+disconnect dut
+send --to dut 'ls' || echo "### CONFIRM dut is not connected anymore ###"
+disconnect all
+
 sleep 1
 echo "[Cleaning up process hopefully]"
 session_stop
@@ -0,0 +1,179 @@
+import socket
+import threading
+import time
+import unittest
+from queue import Queue
+from unittest import mock
+import pyautoport.protocol as protocol
+import pyautoport.teraterm as teraterm
+
+
+class FakeSession:
+    """Connections a and b, waitln on a waits for the test"""
+
+    def __init__(self):
+        self.current = 'a'
+        self.sent = []
+        self.release = threading.Event()
+
+    def connect_check(self, name=None):
+        return (name or self.current) in ('a', 'b')
+
+    def send_data(self, data, name=None):
+        self.sent.append((name, data))
+
+    def read_data(self, data, name=None, since='send'):
+        self.release.wait(5)
+
+    def disconnect(self, name):
+        pass
+
+    def get_env(self, key):
+        return {'HOME': '/home/tester'}.get(key)
+
+
+class TestRunCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.session = FakeSession()
+        patcher = mock.patch('sys.stdout')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_value_of_the_command(self):
+        self.assertEqual(
+            teraterm.run_command(self.session, 'get_env', 'HOME'),
+            {'status': 'ok', 'value': '/home/tester'}
+        )
+        self.assertEqual(
+            teraterm.run_command(self.session, 'send', 'ls', 'b'), {'status': 'ok', 'value': None}
+        )
+        self.assertEqual(self.session.sent, [('b', 'ls')])
+
+    def test_unknown_command(self):
+        for command in ('reboot', None, ['send']):
+            self.assertEqual(
+                teraterm.run_command(self.session, command),
+                {'status': 'error', 'message': f'Unknown command: {command}'}
+            )
+
+    def test_invalid_connection_name(self):
+        response = teraterm.run_command(self.session, 'send', 'ls', ['a'])
+        self.assertEqual(response['status'], 'error')
+        self.assertEqual(self.session.sent, [])
+
+    def test_connection_needed(self):
+        self.assertEqual(
+            teraterm.run_command(self.session, 'send', 'ls', 'c'),
+            {'status': 'error', 'message': 'No connection named c'}
+        )
+        self.session.current = None
+        self.assertEqual(
+            teraterm.run_command(self.session, 'send', 'ls'),
+            {'status': 'error', 'message': 'Did you run connect adb or connect uart'}
+        )
+        self.assertEqual(teraterm.run_command(self.session, 'pause', '0')['status'], 'ok')
+
+    def test_error_of_the_handler(self):
+        self.assertEqual(
+            teraterm.run_command(self.session, 'wait_log', [{'regex': '('}]),
+            {'status': 'error', 'message': 'Invalid regex: missing ), unterminated subpattern'
+             ' at position 0'}
+        )
+        # Malformed argument, not a key and a value
+        self.assertEqual(
+            teraterm.run_command(self.session, 'set_env', 'KEY'),
+            {'status': 'error', 'message': 'not enough values to unpack (expected 2, got 1)'}
+        )
+        response = teraterm.run_command(self.session, 'pause', None)
+        self.assertTrue(response['message'].startswith('TypeError: '), response)
+
+
+class TestRecvHandle(unittest.TestCase):
+
+    def setUp(self):
+        self.session = FakeSession()
+        self.queue_recv = Queue()
+        patcher = mock.patch('sys.stdout')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        thread = threading.Thread(
+            target=teraterm.recv_handle, args=(self.session, self.queue_recv,)
+        )
+        thread.start()
+        self.addCleanup(thread.join, 10)
+        self.addCleanup(self.request, 'stop')
+        self.addCleanup(self.session.release.set)
+
+    def request(self, command, arg='', to=None):
+        """Returns the queue the response is put into"""
+        queue_response = Queue(maxsize=1)
+        self.queue_recv.put(({'command': command, 'arg': arg, 'to': to}, queue_response))
+        return queue_response
+
+    def client(self):
+        """Returns the socket of a client served by client_handle, and the waker"""
+        client_socket, server_socket = socket.socketpair()
+        waiter, waker = socket.socketpair()
+        for item in (client_socket, waiter, waker):
+            self.addCleanup(item.close)
+        thread = threading.Thread(
+            target=teraterm.client_handle, args=(server_socket, self.queue_recv, waker,)
+        )
+        thread.start()
+        self.addCleanup(thread.join, 10)
+        self.addCleanup(client_socket.shutdown, socket.SHUT_WR)
+        return client_socket, waiter
+
+    def test_client_handle_answers_each_request(self):
+        client_socket, _ = self.client()
+        # Frames other than requests are ignored
+        client_socket.sendall(protocol.encode_frame(protocol.DATA, 6, b'ls'))
+        client_socket.sendall(protocol.encode_fields(
+            protocol.REQUEST, 7, command='get_env', arg='HOME'
+        ))
+        client_socket.sendall(protocol.encode_fields(protocol.REQUEST, 8, command='reboot'))
+        kind, request_id, payload = protocol.recv_frame(client_socket)
+        self.assertEqual((kind, request_id), (protocol.END, 7))
+        self.assertEqual(protocol.decode_fields(payload), {'status': 'ok', 'value': '/home/tester'})
+        kind, request_id, payload = protocol.recv_frame(client_socket)
+        self.assertEqual((kind, request_id), (protocol.END, 8))
+        self.assertEqual(
+            protocol.decode_fields(payload),
+            {'status': 'error', 'message': 'Unknown command: reboot'}
+        )
+
+    def test_client_handle_wakes_the_accept_loop_on_stop(self):
+        self.addCleanup(teraterm.event_stop_session.clear)
+        client_socket, waiter = self.client()
+        client_socket.sendall(protocol.encode_fields(protocol.REQUEST, 1, command='stop'))
+        kind, _, payload = protocol.recv_frame(client_socket)
+        self.assertEqual((kind, protocol.decode_fields(payload)), (protocol.END, {'status': 'ok'}))
+        self.assertEqual(waiter.recv(1), b'\0')
+        self.assertIsNone(protocol.recv_frame(client_socket))
+        self.assertTrue(teraterm.event_stop_session.is_set())
+
+    def test_waitln_does_not_hold_other_connections(self):
+        waiting = self.request('wait_log', 'never')
+        start = time.monotonic()
+        response = self.request('send', 'ls', 'b').get(timeout=5)
+        self.assertEqual(response, {'status': 'ok', 'value': None})
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(self.request('pause', '0', 'b').get(timeout=5)['status'], 'ok')
+        self.assertTrue(waiting.empty())
+        self.session.release.set()
+        self.assertEqual(waiting.get(timeout=5), {'status': 'ok', 'value': None})
+
+    def test_commands_of_a_connection_keep_their_order(self):
+        waiting = self.request('wait_log', 'never')
+        sending = self.request('send', 'ls')
+        time.sleep(0.2)
+        self.assertEqual(self.session.sent, [])
+        self.session.release.set()
+        waiting.get(timeout=5)
+        sending.get(timeout=5)
+        self.assertEqual(self.session.sent, [('a', 'ls')])
+
+
+if __name__ == '__main__':
+    unittest.main()
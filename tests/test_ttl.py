@@ -0,0 +1,134 @@
+import unittest
+from pyautoport.ttl import TtlError, TtlRunner, evaluate, parse_ttl, run_block
+
+
+class FakeSession:
+    """Records session commands, waitln finds the texts in found"""
+
+    def __init__(self, found=()):
+        self.found = found
+        self.commands = []
+
+    def request(self, command, arg, to=None):
+        self.commands.append((command, arg) if to is None else (command, arg, to))
+        if command == 'wait_log':
+            for index, pattern in enumerate(arg):
+                text = pattern['regex'] if isinstance(pattern, dict) else pattern
+                if text in self.found:
+                    groups = [text.upper()] if isinstance(pattern, dict) else []
+                    match = {'index': index, 'pattern': text, 'line': f'> {text}', 'groups': groups}
+                    return {'status': 'ok', 'value': match}
+            return {'status': 'ok', 'value': None}
+        if command == 'get_env':
+            return {'status': 'ok', 'value': 'value of ' + arg}
+        if command == 'send' and arg == 'fail':
+            return {'status': 'error', 'message': 'Did you run connect adb or connect uart'}
+        return {'status': 'ok', 'value': None}
+
+
+def run(script, found=(), variables=None):
+    session = FakeSession(found)
+    runner = TtlRunner(session.request, variables)
+    status = run_block(runner, parse_ttl(script))
+    return status, session.commands, runner.variables
+
+
+class TestTtl(unittest.TestCase):
+
+    def test_commands_are_translated(self):
+        _, commands, _ = run('''
+            connect uart   ; comment
+            set_timeout 2
+            send 'ls -l' /
+            mpause 250
+            logwrite "a;b"
+            connect adb dut
+            send --to dut getprop
+            connect uart pmic /dev/ttyUSB2 115200
+        ''')
+        self.assertEqual(commands, [
+            ('connect', 'tty'), ('set_timeout', '2'), ('send', 'ls -l /'),
+            ('pause', '0.25'), ('send_log', 'a;b'),
+            ('connect', 'adb', 'dut'), ('send', 'getprop', 'dut'),
+            ('connect', 'tty /dev/ttyUSB2 115200', 'pmic'),
+        ])
+
+    def test_expressions(self):
+        variables = {'result': 1, 'name': 'abc'}
+        self.assertEqual(evaluate('1 + 2 * 3 - 7 / 2', variables), 4)
+        self.assertEqual(evaluate("result = 1 && name <> 'x'", variables), 1)
+        self.assertEqual(evaluate('!result || 2 >= 3', variables), 0)
+        self.assertEqual(evaluate("name + 'd'", variables), 'abcd')
+        with self.assertRaisesRegex(TtlError, r'unsupported expression: __import__\("os"\)'):
+            evaluate('__import__("os")', variables)
+        with self.assertRaises(TtlError):
+            evaluate('missing + 1', variables)
+        with self.assertRaisesRegex(TtlError, 'bad operand type for unary -'):
+            evaluate("-'a'", variables)
+
+    def test_loops_and_variables(self):
+        _, commands, variables = run('''
+            total = 0
+            for i 1 5
+                if i=4 continue
+                total = total + i
+                send echo $i ${total}
+            next
+            while total > 0
+                total = total - 5
+                if total < 3 then
+                    break
+                endif
+            endwhile
+        ''')
+        self.assertEqual([arg for _, arg in commands], [
+            'echo 1 1', 'echo 2 3', 'echo 3 6', 'echo 5 11',
+        ])
+        self.assertEqual(variables['total'], 1)
+
+    def test_waitln_branching(self):
+        script = '''
+            send reboot
+            if waitln login: then
+                send root
+            elseif waitln U-Boot then
+                send boot
+            else
+                exit 2
+            endif
+            getenv HOME home
+        '''
+        status, commands, variables = run(script, found=('U-Boot',))
+        self.assertEqual(status, 0)
+        self.assertIn(('send', 'boot'), commands)
+        self.assertEqual(variables['result'], 1)
+        self.assertEqual(variables['home'], 'value of HOME')
+        self.assertEqual(variables['inputstr'], '> U-Boot')
+
+        _, commands, variables = run('waitln login: panic\nwaitregex ERR\n', found=('panic', 'ERR'))
+        self.assertEqual(commands, [
+            ('wait_log', ['login:', 'panic']), ('wait_log', [{'regex': 'ERR'}]),
+        ])
+        self.assertEqual(variables['result'], 1)
+        self.assertEqual(variables['groupmatchstr1'], 'ERR')
+        self.assertEqual(variables['groupmatchstr2'], '')
+
+        status, commands, _ = run(script)
+        self.assertEqual(status, 2)
+        self.assertNotIn(('get_env', 'HOME'), commands)
+
+    def test_errors_carry_line_numbers(self):
+        with self.assertRaisesRegex(TtlError, 'line 3: Did you run connect'):
+            run('connect adb\n\nsend fail\n')
+        with self.assertRaisesRegex(TtlError, 'line 1: unknown command: sned'):
+            run('sned ls\n')
+        with self.assertRaisesRegex(TtlError, 'missing endif'):
+            run('if 1 then\nsend ls\n')
+        with self.assertRaisesRegex(TtlError, "line 2: for bounds must be integers, not 1 and 'a'"):
+            run("x = 0\nfor i 1 'a'\nx = i\nnext\n")
+        with self.assertRaisesRegex(TtlError, 'line 1: .* in expression'):
+            run("x = -'a'\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,14 +3,20 @@ from unittest.mock import patch, MagicMock
 import pyautoport.uart as uart  # Assuming the original script is saved as uart.py
 
 import os
+import time
 
 class TestUARTBasicMode(unittest.TestCase):
 
+    def tearDown(self):
+        # Ports are kept open between calls, close them between tests
+        uart.close_uart_ports()
+
     @patch('pyautoport.uart.serial.Serial')
     def test_write_and_read_uart_success(self, mock_serial_class):
         # Create a mock serial instance
         mock_serial_instance = MagicMock()
         mock_serial_class.return_value = mock_serial_instance
+        mock_serial_instance.in_waiting = 0
 
         # Simulate readline returning a few lines and then empty (to break loop)
         mock_serial_instance.readline.side_effect = [
@@ -28,9 +34,11 @@ class TestUARTBasicMode(unittest.TestCase):
         # Check if write was called
         self.assertTrue(mock_serial_instance.write.called)
         written_data = [call_args[0][0] for call_args in mock_serial_instance.write.call_args_list]
-        self.assertIn(b'T', written_data)  # First letter of "Test Message"
+        self.assertEqual(written_data, [b'Test Message'])  # Written in one bulk write
 
-        # Check if close was called
+        # Check if close was called once the port is released
+        mock_serial_instance.close.assert_not_called()
+        uart.close_uart_ports()
         mock_serial_instance.close.assert_called_once()
 
         print(read_data)
@@ -41,6 +49,7 @@ class TestUARTBasicMode(unittest.TestCase):
     def test_write_and_read_uart_binary_garbage(self, mock_serial_class):
         mock_uart = MagicMock()
         mock_serial_class.return_value = mock_uart
+        mock_uart.in_waiting = 0
 
         # Simulate binary garbage followed by normal line
         mock_uart.readline.side_effect = [
@@ -50,11 +59,16 @@ class TestUARTBasicMode(unittest.TestCase):
         ]
 
         # No exceptions should occur on decoding
-        uart.write_and_read_uart("Ping", uart_timeout=0.1, port='COM2', baudrate='4800')
+        read_data = uart.write_and_read_uart("Ping", uart_timeout=0.1, port='COM2',
+                                             baudrate='4800')
+        # Undecodable lines are shown in hex and still end with a newline
+        self.assertTrue(read_data.startswith('fffefa'))
+        self.assertTrue(read_data.endswith('\n'))
 
         # Ensure write called
         self.assertGreater(mock_uart.write.call_count, 0)
         self.assertEqual(mock_uart.readline.call_count, 3)
+        uart.close_uart_ports()
         mock_uart.close.assert_called_once()
 
     @patch('pyautoport.uart.serial.Serial')
@@ -67,6 +81,7 @@ class TestUARTBasicMode(unittest.TestCase):
 
         mock_serial_instance = MagicMock()
         mock_serial_class.return_value = mock_serial_instance
+        mock_serial_instance.in_waiting = 0
         mock_serial_instance.readline.return_value = b''
 
         uart.write_and_read_uart("Check Env", uart_timeout=0.1)
@@ -77,6 +92,218 @@ class TestUARTBasicMode(unittest.TestCase):
             timeout=0.1
         )
 
+    @patch('pyautoport.uart.time.sleep')
+    @patch('pyautoport.uart.serial.Serial')
+    def test_write_and_read_uart_pacing(self, mock_serial_class, mock_sleep):
+        mock_uart = MagicMock()
+        mock_serial_class.return_value = mock_uart
+        mock_uart.in_waiting = 0
+        mock_uart.readline.return_value = b''
+
+        uart.write_and_read_uart("abcde", uart_timeout=0.1, port='COM1', baudrate='9600',
+                                 pacing='chunk', chunk_size=2, delay=0.01)
+        written_data = [call_args[0][0] for call_args in mock_uart.write.call_args_list]
+        self.assertEqual(written_data, [b'ab', b'cd', b'e'])
+        self.assertEqual(mock_sleep.call_count, 3)
+
+        mock_uart.write.reset_mock()
+        uart.write_and_read_uart("abc", uart_timeout=0.1, port='COM1', baudrate='9600',
+                                 pacing='char')
+        written_data = [call_args[0][0] for call_args in mock_uart.write.call_args_list]
+        self.assertEqual(written_data, [b'a', b'b', b'c'])
+
+        with self.assertRaises(ValueError):
+            uart.write_uart(mock_uart, "abc", pacing='unknown')
+
+    @patch('pyautoport.uart.serial.Serial')
+    def test_write_and_read_uart_flow_control(self, mock_serial_class):
+        mock_uart = MagicMock()
+        mock_serial_class.return_value = mock_uart
+        mock_uart.in_waiting = 0
+        mock_uart.readline.return_value = b''
+
+        uart.write_and_read_uart("Flow", uart_timeout=0.1, port='COM1', baudrate='9600',
+                                 flow_control='rtscts')
+        mock_serial_class.assert_called_with(port='COM1', baudrate=9600, timeout=0.1, rtscts=True)
+
+        uart.write_and_read_uart("Flow", uart_timeout=0.1, port='COM1', baudrate='9600',
+                                 flow_control='xonxoff')
+        mock_serial_class.assert_called_with(port='COM1', baudrate=9600, timeout=0.1, xonxoff=True)
+
+    @patch('pyautoport.uart.serial.Serial')
+    def test_write_and_read_uart_keeps_port_open(self, mock_serial_class):
+        mock_uart = MagicMock()
+        mock_serial_class.return_value = mock_uart
+        mock_uart.in_waiting = 0
+        mock_uart.readline.return_value = b''
+
+        uart.write_and_read_uart("First", uart_timeout=0.1, port='COM3', baudrate='9600')
+        uart.write_and_read_uart("Second", uart_timeout=0.1, port='COM3', baudrate='9600')
+        self.assertEqual(mock_serial_class.call_count, 1)
+        mock_uart.close.assert_not_called()
+
+        uart.write_and_read_uart("Third", uart_timeout=0.1, port='COM3', baudrate='9600',
+                                 keep_open=False)
+        mock_uart.close.assert_called_once()
+        uart.write_and_read_uart("Fourth", uart_timeout=0.1, port='COM3', baudrate='9600')
+        self.assertEqual(mock_serial_class.call_count, 2)
+
+    @patch('pyautoport.uart.serial.Serial')
+    def test_write_and_read_uart_drains_idle_port(self, mock_serial_class):
+        mock_uart = MagicMock()
+        mock_serial_class.return_value = mock_uart
+        mock_uart.in_waiting = 0
+        mock_uart.readline.return_value = b''
+
+        uart.write_and_read_uart("First", uart_timeout=0.1, port='COM4', baudrate='9600')
+
+        # Device prints while nobody is reading
+        mock_uart.read.return_value = b'Async line\npart'
+        mock_uart.in_waiting = 15
+        deadline = time.monotonic() + 2
+        while mock_uart.read.call_count == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        mock_uart.in_waiting = 0
+
+        mock_uart.readline.side_effect = [b'ial\n', b'Reply\n', b'']
+        read_data = uart.write_and_read_uart("Second", uart_timeout=0.1, port='COM4',
+                                             baudrate='9600')
+        self.assertEqual(read_data, 'Async line\npartial\nReply\n')
+
+    @patch('pyautoport.uart.serial.Serial')
+    def test_idle_port_evicted(self, mock_serial_class):
+        mock_uart = MagicMock()
+        mock_serial_class.return_value = mock_uart
+        mock_uart.in_waiting = 0
+        mock_uart.readline.return_value = b''
+
+        with patch.object(uart.UART_POOL, 'idle_timeout', 0):
+            uart.write_and_read_uart("Idle", uart_timeout=0.1, port='COM5', baudrate='9600')
+            deadline = time.monotonic() + 2
+            while not mock_uart.close.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+        mock_uart.close.assert_called_once()
+        self.assertEqual(uart.UART_POOL.ports, {})
+
+    @patch('pyautoport.uart.serial.Serial')
+    def test_write_and_read_uart_until(self, mock_serial_class):
+        mock_uart = MagicMock()
+        mock_serial_class.return_value = mock_uart
+        mock_uart.in_waiting = 0
+        mock_uart.read.side_effect = [b'ls\nbin ', b'etc\nroot@dut:~', b'# ', b'late\n', b'']
+
+        read_data = uart.write_and_read_uart("ls\n", uart_timeout=1, port='COM6', baudrate='9600',
+                                             until=uart.DEFAULT_PROMPT)
+        self.assertEqual(read_data, 'ls\nbin etc\nroot@dut:~#\n')
+        self.assertEqual(mock_uart.read.call_count, 3)
+        mock_uart.readline.assert_not_called()
+
+        # Falls back to the timeout when the pattern never appears
+        mock_uart.read.side_effect = [b'no prompt\n', b'']
+        read_data = uart.write_and_read_uart("x\n", uart_timeout=1, port='COM6', baudrate='9600',
+                                             until='login:')
+        self.assertEqual(read_data, 'no prompt\n')
+
+    @patch('pyautoport.uart.serial.Serial')
+    def test_iter_uart_yields_lines_as_they_arrive(self, mock_serial_class):
+        mock_uart = MagicMock()
+        mock_serial_class.return_value = mock_uart
+        mock_uart.in_waiting = 0
+        mock_uart.readline.side_effect = [b'first\n', b'second\n', b'']
+
+        reply = uart.iter_uart("dump\n", uart_timeout=0.1, port='COM7', baudrate='9600')
+        mock_serial_class.assert_not_called()
+        self.assertEqual(next(reply), 'first\n')
+        self.assertEqual(mock_uart.readline.call_count, 1)
+        self.assertEqual(list(reply), ['second\n'])
+
+    @patch('pyautoport.uart.serial.Serial')
+    def test_close_port_of_suspended_iter_uart(self, mock_serial_class):
+        mock_uart = MagicMock()
+        mock_serial_class.return_value = mock_uart
+        mock_uart.in_waiting = 0
+        mock_uart.readline.side_effect = [b'first\n', b'second\n', b'']
+
+        # As at exit, the generator never resumes to release the port
+        reply = uart.iter_uart("dump\n", uart_timeout=0.1, port='COM7', baudrate='9600')
+        self.assertEqual(next(reply), 'first\n')
+        start = time.monotonic()
+        uart.UART_POOL.close(timeout=0.1)
+        self.assertLess(time.monotonic() - start, 1)
+        mock_uart.close.assert_called_once()
+        self.assertEqual(uart.UART_POOL.ports, {})
+        reply.close()
+
+    @patch('pyautoport.uart.serial.Serial')
+    def test_iter_uart_raw_chunks(self, mock_serial_class):
+        mock_uart = MagicMock()
+        mock_serial_class.return_value = mock_uart
+        mock_uart.in_waiting = 0
+        mock_uart.read.side_effect = [b'\x00\xff', b'\r\nend', b'']
+
+        chunks = list(uart.iter_uart("md 0\n", uart_timeout=0.1, port='COM7', baudrate='9600',
+                                     chunks=True, raw=True))
+        self.assertEqual(chunks, [b'\x00\xff', b'\r\nend'])
+
+        mock_uart.readline.side_effect = [b'\x00\xff\r\n', b'end', b'']
+        read_data = uart.write_and_read_uart("md 0\n", uart_timeout=0.1, port='COM7',
+                                             baudrate='9600', raw=True)
+        self.assertEqual(read_data, b'\x00\xff\r\nend')
+
+    def test_parse_uart_batch(self):
+        commands = uart.parse_uart_batch([
+            'ls\n',
+            '\n',
+            '# comment\n',
+            '{"text": "reboot", "until": "login:", "timeout": 30}\n',
+            '{ echo grouped; }\n',
+        ])
+        self.assertEqual(commands, [
+            {'text': 'ls'},
+            {'text': 'reboot', 'until': 'login:', 'timeout': 30},
+            {'text': '{ echo grouped; }'},
+        ])
+
+    @patch('pyautoport.uart.serial.Serial')
+    def test_run_uart_batch_over_one_port(self, mock_serial_class):
+        mock_uart = MagicMock()
+        mock_serial_class.return_value = mock_uart
+        mock_uart.in_waiting = 0
+        mock_uart.read.side_effect = [b'bin etc\n# ', b'login:']
+
+        results = list(uart.run_uart_batch(
+            [{'text': 'ls'}, {'text': 'reboot', 'until': 'login:', 'timeout': 30}],
+            0.5, until=uart.DEFAULT_PROMPT, port='COM8', baudrate='9600'
+        ))
+        self.assertEqual(mock_serial_class.call_count, 1)
+        written_data = [call_args[0][0] for call_args in mock_uart.write.call_args_list]
+        self.assertEqual(written_data, [b'ls\n', b'reboot\n'])
+        self.assertEqual([result['reply'] for result in results], ['bin etc\n#\n', 'login:\n'])
+        self.assertEqual([result['matched'] for result in results], [True, True])
+        self.assertEqual(mock_uart.timeout, 30)
+
+    @patch('pyautoport.uart.serial.Serial')
+    def test_run_uart_batch_ignores_buffered_output_for_matched(self, mock_serial_class):
+        mock_uart = MagicMock()
+        mock_serial_class.return_value = mock_uart
+        mock_uart.in_waiting = 0
+        mock_uart.read.side_effect = [b'rebooting\n', b'']
+
+        # Printed by the device before the command was sent
+        pooled = uart.UART_POOL.acquire('COM8', '9600', 0.5)
+        pooled.buffer += b'login:\n'
+        uart.UART_POOL.release(pooled)
+        results = list(uart.run_uart_batch(
+            [{'text': 'reboot', 'until': 'login:'}], 0.5, port='COM8', baudrate='9600'
+        ))
+        self.assertEqual(results[0]['reply'], 'login:\nrebooting\n')
+        self.assertIs(results[0]['matched'], False)
+
+    def test_uart_send_output_requires_batch(self):
+        with patch('sys.argv', ['uart_send', '-o', os.devnull, 'ls']), \
+                patch('sys.stderr'), self.assertRaises(SystemExit):
+            uart.uart_send()
+
     def test_get_default_port_from_env(self):
         os.environ['TESTER_UART_PORT'] = 'COM5'
         self.assertEqual(uart.get_default_port(), 'COM5')